@@ -1,5 +1,6 @@
 import os
 import uuid
+import asyncio
 import logging
 import jwt
 import motor.motor_asyncio
@@ -9,6 +10,7 @@ from fastapi import APIRouter, File, UploadFile, Form, HTTPException, status, Re
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field
 from .interviewprep import extract_text_from_document, vision_client, openai_client
+from .cv_utils import extracted_text_fields
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -198,7 +200,7 @@ async def save_cv(
                     "fileSize": len(file_content),
                     "filePath": actual_file_path,
                     "contentType": cv_file.content_type or "application/octet-stream",
-                    "extractedText": extracted_text,
+                    **extracted_text_fields(extracted_text),
                     "lastUsed": datetime.utcnow()
                 }}
             )
@@ -232,7 +234,7 @@ async def save_cv(
                 "fileSize": len(file_content),
                 "filePath": actual_file_path,
                 "contentType": cv_file.content_type or "application/octet-stream",
-                "extractedText": extracted_text,
+                **extracted_text_fields(extracted_text),
                 "uploadedAt": datetime.utcnow(),
                 "lastUsed": datetime.utcnow()
             }
@@ -386,6 +388,14 @@ async def delete_cv(cv_id: str, request: Request):
         except Exception as file_error:
             logger.error(f"Error deleting CV file: {file_error}")
 
+        # A copy uploaded to OpenAI for Vision extraction and not yet cleaned up
+        if cv.get("openaiFileId") and openai_client is not None:
+            try:
+                await asyncio.to_thread(openai_client.files.delete, cv["openaiFileId"])
+                logger.info(f"Deleted OpenAI file {cv['openaiFileId']}")
+            except Exception as openai_error:
+                logger.error(f"Error deleting OpenAI file {cv['openaiFileId']}: {openai_error}")
+
         result = await cvs_col.delete_one({"_id": ObjectId(cv_id)})
         if result.deleted_count == 0:
             logger.warning(f"Failed to delete CV from database: {cv_id}")
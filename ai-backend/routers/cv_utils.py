@@ -1,12 +1,114 @@
 import os
-import random
+import time
+import secrets
+import hashlib
+import asyncio
 import logging
+import jwt
 from typing import Dict, List, Optional, Union, Any
 from datetime import datetime
 from bson import ObjectId
 
 logger = logging.getLogger("futureforceai")
 
+# lastUsed is bookkeeping, so requests don't wait on it: touches are queued here
+# and a background task writes them about once a second, one update per collection
+LAST_USED_FLUSH_SECONDS = 1.0
+_pending_last_used: Dict[str, tuple] = {}
+_last_used_flusher: Optional[asyncio.Task] = None
+
+def mark_cv_used(collection, doc_id) -> None:
+    """
+    Queue a lastUsed update for a CV document. Must be called from within the
+    event loop; the write happens on the next flush, off the request path.
+    """
+    global _last_used_flusher
+    _, ids = _pending_last_used.setdefault(collection.full_name, (collection, set()))
+    ids.add(doc_id)
+    if _last_used_flusher is None or _last_used_flusher.done():
+        _last_used_flusher = asyncio.get_running_loop().create_task(_flush_last_used())
+
+async def _flush_last_used() -> None:
+    while _pending_last_used:
+        await asyncio.sleep(LAST_USED_FLUSH_SECONDS)
+        batch = list(_pending_last_used.values())
+        _pending_last_used.clear()
+        now = datetime.utcnow()
+        for collection, ids in batch:
+            try:
+                await collection.update_many({"_id": {"$in": list(ids)}}, {"$set": {"lastUsed": now}})
+            except Exception as e:
+                logger.error(f"Failed to update lastUsed for {len(ids)} CVs in {collection.full_name}: {e}")
+
+class TTLCache:
+    """
+    Small per-process cache of key -> value with a per-entry expiry. When full,
+    the oldest insertion is dropped (dicts keep insertion order). Only touched
+    from the event loop thread, so no lock is needed.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: Dict[Any, tuple] = {}
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        value, expires_at = entry
+        if time.time() >= expires_at:
+            del self._entries[key]
+            return default
+        return value
+
+    def set(self, key, value, ttl_seconds: float, expires_at: Optional[float] = None) -> None:
+        """Store value for ttl_seconds, or until expires_at if that is sooner."""
+        until = time.time() + ttl_seconds
+        if expires_at is not None:
+            until = min(until, expires_at)
+        if key not in self._entries and len(self._entries) >= self.max_size:
+            del self._entries[next(iter(self._entries))]
+        self._entries[key] = (value, until)
+
+# Verified token payloads, keyed by sha256 of the secret and token so raw
+# credentials are not held in memory; the short TTL bounds how long a revoked
+# or rotated-secret token keeps being accepted
+TOKEN_CACHE_TTL_SECONDS = 10
+TOKEN_CACHE_MAX_SIZE = 10000
+# Rejections are remembered too, briefly, so a client retrying a bad token
+# doesn't cost a signature check per attempt. Only rejections that can't turn
+# into a success later are cached: a not-yet-valid (nbf/iat) token is retried.
+TOKEN_REJECTION_TTL_SECONDS = 5
+# The frontend signs { userId } with a 1h expiry and no audience or issuer; a
+# token missing either claim is rejected by the decode itself
+JWT_DECODE_OPTIONS = {"verify_aud": False, "verify_iss": False, "require": ["exp", "userId"]}
+
+_token_cache = TTLCache(TOKEN_CACHE_MAX_SIZE)
+
+def decode_token(token: str, secret_key: str) -> dict:
+    """
+    jwt.decode (HS256), with verified payloads reused for TOKEN_CACHE_TTL_SECONDS
+    and rejections re-raised for TOKEN_REJECTION_TTL_SECONDS
+    """
+    key = hashlib.sha256(f"{secret_key}\0{token}".encode("utf-8")).hexdigest()
+    result = _token_cache.get(key)
+    if isinstance(result, jwt.PyJWTError):
+        # Fresh traceback, so re-raising doesn't grow the cached one
+        raise result.with_traceback(None)
+    if result is not None:
+        return result
+
+    try:
+        payload = jwt.decode(token, secret_key, algorithms=["HS256"], options=JWT_DECODE_OPTIONS)
+    except jwt.ImmatureSignatureError:
+        raise
+    except jwt.PyJWTError as e:
+        _token_cache.set(key, e, TOKEN_REJECTION_TTL_SECONDS)
+        raise
+    # Never cache past the token's own expiry
+    _token_cache.set(key, payload, TOKEN_CACHE_TTL_SECONDS, expires_at=payload.get("exp"))
+    return payload
+
 def ensure_uploads_dir() -> str:
     """
     Ensure the uploads directory exists in the FastAPI container.
@@ -19,17 +121,33 @@ def ensure_uploads_dir() -> str:
 def generate_timestamp_id() -> str:
     """
     Generate a timestamp-based ID for consistent file naming.
-    Format: YYYYMMDD-HHMMSS-random_suffix
+    Format: YYYYMMDD-HHMMSS-xxxxxx (6 random hex characters)
     """
-    timestamp = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
-    random_suffix = ''.join(random.choices('abcdefghijklmnopqrstuvwxyz0123456789', k=6))
-    return f"{timestamp}-{random_suffix}"
+    return f"{datetime.utcnow():%Y%m%d-%H%M%S}-{secrets.token_hex(3)}"
+
+# Spaces and path separators, all mapped to underscores in one pass
+FILENAME_UNSAFE_CHARS = str.maketrans({' ': '_', '/': '_', '\\': '_'})
 
 def clean_filename(filename: str) -> str:
     """
     Clean a filename to avoid special characters and spaces.
     """
-    return filename.replace(' ', '_').replace('/', '_').replace('\\', '_')
+    return filename.translate(FILENAME_UNSAFE_CHARS)
+
+MIN_CV_TEXT_CHARS = 100
+
+def extracted_text_fields(extracted_text: str) -> Dict[str, Any]:
+    """
+    The extractedText field for a CV document, along with its stripped length
+    and whether that is enough to use, so readers can check the flag instead
+    of measuring the text.
+    """
+    length = len(extracted_text.strip()) if extracted_text else 0
+    return {
+        "extractedText": extracted_text,
+        "extractedTextLength": length,
+        "extractedTextReady": length >= MIN_CV_TEXT_CHARS
+    }
 
 def get_potential_file_paths(cv_document: Dict[str, Any]) -> List[str]:
     """
@@ -98,7 +216,7 @@ async def save_cv_to_db(
         "filePath": file_path,
         "fileSize": file_size,
         "contentType": content_type,
-        "extractedText": extracted_text,
+        **extracted_text_fields(extracted_text),
         "uploadedAt": datetime.utcnow(),
         "lastUsed": datetime.utcnow(),
         "fileId": file_id
@@ -148,7 +266,7 @@ async def update_cv_with_extracted_text(collection, cv_id: Union[str, ObjectId],
     """
     try:
         update_data = {
-            "extractedText": extracted_text,
+            **extracted_text_fields(extracted_text),
             "lastUsed": datetime.utcnow()
         }
         
@@ -1,7 +1,8 @@
 import os
 import uuid
 import logging
-import random
+import secrets
+import asyncio
 import motor.motor_asyncio
 import jwt
 import base64
@@ -10,7 +11,7 @@ from datetime import datetime
 from fastapi import APIRouter, File, UploadFile, Form, HTTPException, status, Request, BackgroundTasks
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field
-from bson import ObjectId
+from bson import ObjectId, Binary
 from .pdf_extraction import extract_text_from_document
 from dotenv import load_dotenv
 
@@ -28,11 +29,12 @@ except ImportError:
 
 try:
     import openai
-    from openai import OpenAI
+    from openai import OpenAI, AsyncOpenAI
 except ImportError:
     logger.warning("OpenAI library not installed")
     openai = None
     OpenAI = None
+    AsyncOpenAI = None
 
 
 load_dotenv()
@@ -47,13 +49,33 @@ logger.info(f"Using OpenAI model: {OPENAI_MODEL}")
 MAX_INTERVIEW_QUESTIONS = int(os.getenv("MAX_INTERVIEW_QUESTIONS", "5"))
 logger.info(f"Maximum interview questions set to: {MAX_INTERVIEW_QUESTIONS}")
 
+# openai_client (sync) serves the text extractors, which run in worker threads.
+# async_openai_client is the one async client for calls made from handlers in
+# every router, with a bounded pool of kept-alive connections shared by all
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "64"))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "32"))
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "60"))
+
 openai_client = None
+async_openai_client = None
 openai_api_key = os.getenv("OPENAI_API_KEY")
 if openai is not None:
     if openai_api_key:
         try:
             if hasattr(openai, 'OpenAI'):
+                import httpx
+
                 openai_client = OpenAI(api_key=openai_api_key)
+                async_openai_client = AsyncOpenAI(
+                    api_key=openai_api_key,
+                    http_client=httpx.AsyncClient(
+                        limits=httpx.Limits(
+                            max_connections=OPENAI_MAX_CONNECTIONS,
+                            max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS
+                        ),
+                        timeout=httpx.Timeout(OPENAI_TIMEOUT_SECONDS, connect=10.0)
+                    )
+                )
                 logger.info("OpenAI v1.x client initialized")
             else:
                 logger.info("Using legacy OpenAI v0.x API")
@@ -94,6 +116,58 @@ except Exception as e:
 router = APIRouter()
 logger.info("API Router created with no prefix")
 
+# Interview sessions are purged this long after they were created
+CONVERSATION_TTL_SECONDS = int(os.getenv("CONVERSATION_TTL_SECONDS", str(60 * 60 * 24 * 30)))
+
+# Built one at a time so a failure (e.g. duplicate session_id values in an old
+# database blocking the unique index) doesn't skip the others; the unique
+# session_id index, the one most likely to fail, goes last
+CONVERSATION_INDEXES = [
+    ([("user_id", 1), ("created_at", -1)], {}),
+    ("created_at", {"expireAfterSeconds": CONVERSATION_TTL_SECONDS}),
+    # Session lookups match the 16-byte session_uuid, or session_id for
+    # sessions created before it existed
+    ("session_uuid", {"unique": True, "partialFilterExpression": {"session_uuid": {"$exists": True}}}),
+    # Same unique index the frontend's Conversation model declares
+    ("session_id", {"unique": True}),
+]
+
+@router.on_event("shutdown")
+async def close_openai_client():
+    if async_openai_client is not None:
+        await async_openai_client.close()
+
+@router.on_event("startup")
+async def create_conversation_indexes():
+    """Index session lookups and per-user listings, and expire old sessions via a TTL index"""
+    if conversations_col is None:
+        return
+    for keys, options in CONVERSATION_INDEXES:
+        try:
+            await conversations_col.create_index(keys, **options)
+        except Exception as e:
+            logger.error(f"Error creating conversation index {keys}: {e}")
+
+
+def new_session_id() -> tuple:
+    """
+    A fresh session ID as (hex string returned to the client, 16-byte BSON UUID
+    stored in session_uuid and used for lookups)
+    """
+    sid_uuid = uuid.uuid4()
+    return sid_uuid.hex, Binary.from_uuid(sid_uuid)
+
+def session_filter(session_id: str) -> dict:
+    """
+    Mongo filter for a session ID from the client. Sessions created before
+    session_uuid existed only carry the string session_id, so that is matched too.
+    """
+    try:
+        sid_uuid = uuid.UUID(session_id)
+    except (ValueError, TypeError, AttributeError):
+        return {"session_id": session_id}
+    return {"$or": [{"session_uuid": Binary.from_uuid(sid_uuid)}, {"session_id": session_id}]}
+
 
 # Pydantic Models
 class ChatMessage(BaseModel):
@@ -430,14 +504,17 @@ async def start_interview(
         try:
             from .cv_utils import (
                 ensure_uploads_dir, generate_timestamp_id, clean_filename,
-                get_potential_file_paths, save_cv_to_db, find_cv_by_id
+                get_potential_file_paths, save_cv_to_db, find_cv_by_id, mark_cv_used
             )
         except ImportError:
             logger.warning("cv_utils module not found, using built-in functions")
            
             ensure_uploads_dir = lambda: os.makedirs("/app/uploads", exist_ok=True) or "/app/uploads"
-            generate_timestamp_id = lambda: f"{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}-{''.join(random.choices('abcdefghijklmnopqrstuvwxyz0123456789', k=6))}"
+            generate_timestamp_id = lambda: f"{datetime.utcnow():%Y%m%d-%H%M%S}-{secrets.token_hex(3)}"
             clean_filename = lambda f: f.replace(' ', '_').replace('/', '_').replace('\\', '_')
+            mark_cv_used = lambda col, doc_id: asyncio.ensure_future(
+                col.update_one({"_id": doc_id}, {"$set": {"lastUsed": datetime.utcnow()}})
+            )
         
         
         if cv_file:
@@ -583,13 +660,7 @@ async def start_interview(
                             content={"detail": "Could not extract sufficient content from CV"}
                         )
                 else:
-                    try:
-                        await cv_collection.update_one(
-                            {"_id": cv_document["_id"]},
-                            {"$set": {"lastUsed": datetime.utcnow()}}
-                        )
-                    except Exception as update_err:
-                        logger.error(f"Failed to update CV last used timestamp: {update_err}")
+                    mark_cv_used(cv_collection, cv_document["_id"])
                         
             except Exception as e:
                 logger.error(f"Error retrieving CV: {e}")
@@ -604,7 +675,7 @@ async def start_interview(
                 status_code=400,
                 content={"detail": "Could not extract sufficient content from CV"}
             )
-        session_id = str(uuid.uuid4())
+        session_id, session_uuid = new_session_id()
         logger.info(f"Generated session ID: {session_id}")
 
         initial_ai_text = (
@@ -614,6 +685,7 @@ async def start_interview(
 
         conversation_doc = {
             "session_id": session_id,
+            "session_uuid": session_uuid,
             "user_id": user_id,
             "job_role": job_role,
             "cv_text": cv_text,
@@ -678,7 +750,7 @@ async def interview_chat(request: ChatRequest):
             return fallback_response
             
         # Find the conversation
-        convo = await conversations_col.find_one({"session_id": request.session_id})
+        convo = await conversations_col.find_one(session_filter(request.session_id))
         if not convo:
             logger.warning(f"Session not found: {request.session_id}")
             return JSONResponse(
@@ -722,7 +794,7 @@ async def interview_chat(request: ChatRequest):
             
    
             await conversations_col.update_one(
-                {"session_id": request.session_id},
+                session_filter(request.session_id),
                 {"$set": {"messages": messages, "finished": True}}
             )
             logger.info(f"Session {request.session_id} completed with final feedback")
@@ -745,7 +817,7 @@ async def interview_chat(request: ChatRequest):
         # Update conversation in database
         try:
             await conversations_col.update_one(
-                {"session_id": request.session_id},
+                session_filter(request.session_id),
                 {"$set": {"messages": messages}}
             )
             logger.info(f"Updated conversation in database for session {request.session_id}")
@@ -883,7 +955,7 @@ async def get_session(session_id: str, request: Request):
         )
 
     try:
-        session = await conversations_col.find_one({"session_id": session_id})
+        session = await conversations_col.find_one(session_filter(session_id))
         
         if not session:
             logger.warning(f"Session not found: {session_id}")
@@ -1049,7 +1121,7 @@ async def delete_session(session_id: str, request: Request):
             content={"detail": "Database unavailable"}
         )
         
-    session = await conversations_col.find_one({"session_id": session_id})
+    session = await conversations_col.find_one(session_filter(session_id))
     if not session:
         logger.warning(f"Session not found: {session_id}")
         return JSONResponse(
@@ -1063,7 +1135,7 @@ async def delete_session(session_id: str, request: Request):
             status_code=403,
             content={"detail": "Unauthorized access"}
         )
-    result = await conversations_col.delete_one({"session_id": session_id})
+    result = await conversations_col.delete_one(session_filter(session_id))
     if result.deleted_count == 0:
         logger.warning(f"Session not deleted: {session_id}")
         return JSONResponse(
@@ -1280,7 +1352,7 @@ async def update_session_config(session_id: str, config: SessionConfigUpdate, re
                 content={"detail": "Database unavailable"}
             )
             
-        session = await conversations_col.find_one({"session_id": session_id})
+        session = await conversations_col.find_one(session_filter(session_id))
         if not session:
             logger.warning(f"Session not found: {session_id}")
             return JSONResponse(
@@ -1303,7 +1375,7 @@ async def update_session_config(session_id: str, config: SessionConfigUpdate, re
             )
             
         result = await conversations_col.update_one(
-            {"session_id": session_id},
+            session_filter(session_id),
             {"$set": {"max_questions": config.max_questions}}
         )
         
@@ -1363,7 +1435,7 @@ async def reset_session(session_id: str, request: Request):
                 content={"detail": "Database unavailable"}
             )
             
-        session = await conversations_col.find_one({"session_id": session_id})
+        session = await conversations_col.find_one(session_filter(session_id))
         if not session:
             logger.warning(f"Session not found: {session_id}")
             return JSONResponse(
@@ -1385,7 +1457,7 @@ async def reset_session(session_id: str, request: Request):
         )
         
         result = await conversations_col.update_one(
-            {"session_id": session_id},
+            session_filter(session_id),
             {
                 "$set": {
                     "messages": [{"sender": "ai", "text": initial_ai_text}],
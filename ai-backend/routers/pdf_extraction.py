@@ -1,95 +1,198 @@
 import os
+import asyncio
 import logging
 import base64
-from typing import Optional, Tuple
+import functools
+import hashlib
+import importlib
+import importlib.util
+import io
+import json
+import mimetypes
+import mmap
+import shutil
+from typing import Any, Callable, Dict, List, Optional, Tuple
 import subprocess
 import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
-try:
-    import PyPDF2
-    PYPDF2_AVAILABLE = True
-except ImportError:
+def _module_available(name: str) -> bool:
+    """Check a module is installed without paying to import it."""
+    return importlib.util.find_spec(name) is not None
+
+# The PDF libraries are imported on first use rather than at startup; PyMuPDF
+# alone pulls in ~15 MB of shared libraries, which slowed worker boot and --reload
+PYPDF2_AVAILABLE = _module_available("PyPDF2")
+if not PYPDF2_AVAILABLE:
     logger.warning("PyPDF2 not installed, falling back to other methods")
-    PYPDF2_AVAILABLE = False
 
-try:
-    from pdf2image import convert_from_path
-    PDF2IMAGE_AVAILABLE = True
-except ImportError:
+PDF2IMAGE_AVAILABLE = _module_available("pdf2image")
+if not PDF2IMAGE_AVAILABLE:
     logger.warning("pdf2image not installed, PDF to image conversion unavailable")
-    PDF2IMAGE_AVAILABLE = False
+
+PYMUPDF_AVAILABLE = _module_available("fitz")
+if not PYMUPDF_AVAILABLE:
+    logger.warning("PyMuPDF not installed, falling back to other methods")
+
+PYPDFIUM2_AVAILABLE = _module_available("pypdfium2")
+if not PYPDFIUM2_AVAILABLE:
+    logger.warning("pypdfium2 not installed, falling back to other methods")
+
+PILLOW_AVAILABLE = _module_available("PIL")
+if not PILLOW_AVAILABLE:
+    logger.warning("Pillow not installed, images will be sent to OCR uncompressed")
+
+def _pypdf2():
+    return importlib.import_module("PyPDF2")
+
+def _pdf2image():
+    return importlib.import_module("pdf2image")
+
+def _pil_image():
+    return importlib.import_module("PIL.Image")
+
+def _fitz():
+    return importlib.import_module("fitz")
+
+def _pdfium():
+    return importlib.import_module("pypdfium2")
 
 try:
-    import fitz  
-    PYMUPDF_AVAILABLE = True
+    from google.cloud import vision
+    VISION_AVAILABLE = True
 except ImportError:
-    logger.warning("PyMuPDF not installed, falling back to other methods")
-    PYMUPDF_AVAILABLE = False
+    logger.warning("Google Cloud Vision library not installed, Vision OCR unavailable")
+    vision = None
+    VISION_AVAILABLE = False
+
+# PDFium isn't thread-safe: no two calls may overlap, even on different documents
+_pdfium_lock = threading.Lock()
+
+def extract_text_with_pdfium(file_path: str, pdf_bytes: Optional[bytes] = None) -> str:
+    """Extract text from PDF using pypdfium2 (Google's PDFium engine). Pass pdf_bytes to reuse an already-read file."""
+    if not PYPDFIUM2_AVAILABLE:
+        return ""
+
+    try:
+        logger.info(f"Extracting text from PDF with pypdfium2: {file_path}")
+        with _pdfium_lock:
+            pdf = _pdfium().PdfDocument(pdf_bytes if pdf_bytes is not None else file_path)
+            try:
+                text = "".join(page.get_textpage().get_text_range() + "\n" for page in pdf)
+            finally:
+                pdf.close()
 
-def extract_text_from_pdf_with_pypdf2(file_path: str) -> str:
-    """Extract text from PDF using PyPDF2."""
+        logger.info(f"Extracted {len(text)} characters with pypdfium2")
+        return text
+    except Exception as e:
+        logger.error(f"Error extracting text with pypdfium2: {e}")
+        return ""
+
+def extract_text_from_pdf_with_pypdf2(file_path: str, pdf_bytes: Optional[bytes] = None) -> str:
+    """Extract text from PDF using PyPDF2. Pass pdf_bytes to reuse an already-read file."""
     try:
         logger.info(f"Extracting text from PDF with PyPDF2: {file_path}")
-        with open(file_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            text = ""
-            for page_num in range(len(pdf_reader.pages)):
-                page = pdf_reader.pages[page_num]
-                text += page.extract_text() + "\n"
-            
-            logger.info(f"Extracted {len(text)} characters with PyPDF2")
-            return text
+        if pdf_bytes is None:
+            with open(file_path, 'rb') as file:
+                pdf_bytes = file.read()
+        
+        pdf_reader = _pypdf2().PdfReader(io.BytesIO(pdf_bytes))
+        text = "".join((page.extract_text() or "") + "\n" for page in pdf_reader.pages)
+        
+        logger.info(f"Extracted {len(text)} characters with PyPDF2")
+        return text
     except Exception as e:
         logger.error(f"Error extracting text with PyPDF2: {e}")
         return ""
 
-def extract_text_with_pymupdf(file_path: str) -> str:
-    """Extract text from PDF using PyMuPDF (fitz)."""
+# Below this page count the cost of shipping work to other processes
+# outweighs the parallel speed-up, so small CVs are parsed inline
+PYMUPDF_PARALLEL_MIN_PAGES = 8
+PYMUPDF_MAX_WORKERS = min(os.cpu_count() or 1, 4)
+
+_pymupdf_pool = None
+
+# MuPDF must not be entered from two threads at once, even for different
+# documents; every in-process fitz call takes this lock (pool workers are
+# separate processes and don't need it)
+_fitz_lock = threading.Lock()
+
+def _init_pymupdf_worker():
+    """Silence MuPDF warnings in pool workers."""
+    fitz = _fitz()
+    fitz.TOOLS.mupdf_display_errors(False)
+    fitz.TOOLS.mupdf_display_warnings(False)
+
+def _get_pymupdf_pool() -> ProcessPoolExecutor:
+    global _pymupdf_pool
+    if _pymupdf_pool is None:
+        _pymupdf_pool = ProcessPoolExecutor(
+            max_workers=PYMUPDF_MAX_WORKERS,
+            initializer=_init_pymupdf_worker
+        )
+    return _pymupdf_pool
+
+def _mupdf_range(file_path: str, start: int, end: int) -> Tuple[int, str]:
+    """Extract pages [start, end) in a worker; fitz documents can't be pickled so each worker opens its own."""
+    with _fitz().open(file_path) as doc:
+        text = "".join(doc[page_num].get_text() + "\n" for page_num in range(start, end))
+    return start, text
+
+def extract_text_with_pymupdf(file_path: str, pdf_bytes: Optional[bytes] = None) -> str:
+    """Extract text from PDF using PyMuPDF (fitz). Pass pdf_bytes to reuse an already-read file."""
     if not PYMUPDF_AVAILABLE:
         return ""
         
     try:
         logger.info(f"Extracting text from PDF with PyMuPDF: {file_path}")
-        doc = fitz.open(file_path)
-        text = ""
-        for page_num in range(len(doc)):
-            text += doc[page_num].get_text() + "\n"
+        fitz = _fitz()
+        with _fitz_lock:
+            source = fitz.open(stream=pdf_bytes, filetype="pdf") if pdf_bytes is not None else fitz.open(file_path)
+            with source as doc:
+                page_count = len(doc)
+                if page_count < PYMUPDF_PARALLEL_MIN_PAGES or PYMUPDF_MAX_WORKERS < 2:
+                    text = "".join(doc[page_num].get_text() + "\n" for page_num in range(page_count))
+                    logger.info(f"Extracted {len(text)} characters with PyMuPDF")
+                    return text
+
+        chunk = -(-page_count // PYMUPDF_MAX_WORKERS)
+        pool = _get_pymupdf_pool()
+        futures = [
+            pool.submit(_mupdf_range, file_path, start, min(start + chunk, page_count))
+            for start in range(0, page_count, chunk)
+        ]
+        parts = sorted(future.result() for future in futures)
+        text = "".join(part for _, part in parts)
         
-        logger.info(f"Extracted {len(text)} characters with PyMuPDF")
+        logger.info(f"Extracted {len(text)} characters with PyMuPDF across {len(parts)} workers")
         return text
     except Exception as e:
         logger.error(f"Error extracting text with PyMuPDF: {e}")
         return ""
 
+@functools.lru_cache(maxsize=1)
 def check_for_pdftotext() -> bool:
     """Check if pdftotext (from poppler-utils) is installed."""
-    try:
-        subprocess.run(["pdftotext", "-v"], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        return True
-    except (FileNotFoundError, subprocess.SubprocessError):
-        return False
+    return shutil.which("pdftotext") is not None
 
 def extract_text_with_pdftotext(file_path: str) -> str:
     """Extract text from PDF using pdftotext utility."""
     try:
         logger.info(f"Extracting text from PDF with pdftotext: {file_path}")
-        with tempfile.NamedTemporaryFile(suffix='.txt', delete=False) as temp_file:
-            temp_txt_path = temp_file.name
-        
+        # "-" sends the text to stdout so nothing round-trips through a temp file
         result = subprocess.run(
-            ["pdftotext", "-layout", file_path, temp_txt_path],
+            ["pdftotext", "-q", "-layout", "-enc", "UTF-8", file_path, "-"],
             check=True,
             stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
+            stderr=subprocess.DEVNULL
         )
-        
-        with open(temp_txt_path, 'r', encoding='utf-8', errors='replace') as f:
-            text = f.read()
-        
-        os.unlink(temp_txt_path)
+        text = result.stdout.decode('utf-8', errors='replace')
         
         logger.info(f"Extracted {len(text)} characters with pdftotext")
         return text
@@ -97,38 +200,124 @@ def extract_text_with_pdftotext(file_path: str) -> str:
         logger.error(f"Error extracting text with pdftotext: {e}")
         return ""
 
-def convert_pdf_to_images(file_path: str, dpi: int = 300) -> list:
-    """Convert PDF to a list of images."""
+# pdftoppm is single-threaded unless told otherwise; leave one core for the event loop
+PDF2IMAGE_THREAD_COUNT = max(1, (os.cpu_count() or 2) - 1)
+
+def convert_pdf_to_images(file_path: str, output_folder: str, dpi: int = 200) -> list:
+    """
+    Rasterize a PDF into JPEG files inside output_folder and return their paths.
+    The caller owns output_folder and must keep it alive while the paths are used.
+    """
     try:
         logger.info(f"Converting PDF to images: {file_path}")
-        with tempfile.TemporaryDirectory() as temp_dir:
-            images = convert_from_path(file_path, dpi=dpi, output_folder=temp_dir)
-            logger.info(f"Converted PDF to {len(images)} images")
-            
-            image_paths = []
-            for i, img in enumerate(images):
-                img_path = os.path.join(temp_dir, f"page_{i+1}.png")
-                img.save(img_path, "PNG")
-                image_paths.append(img_path)
-            
-            return image_paths
+        image_paths = _pdf2image().convert_from_path(
+            file_path,
+            dpi=dpi,
+            output_folder=output_folder,
+            paths_only=True,
+            thread_count=PDF2IMAGE_THREAD_COUNT,
+            fmt="jpeg",
+            jpegopt={"quality": 85}
+        )
+        logger.info(f"Converted PDF to {len(image_paths)} images")
+        return image_paths
     except Exception as e:
         logger.error(f"Error converting PDF to images: {e}")
         return []
 
+# Older Python builds (e.g. the 3.10 image) don't register .webp by default
+mimetypes.add_type('image/webp', '.webp')
+
+_EXT_TYPE = {
+    '.pdf': 'pdf',
+    '.jpg': 'image',
+    '.jpeg': 'image',
+    '.png': 'image',
+    '.bmp': 'image',
+    '.tiff': 'image',
+    '.webp': 'image',
+    '.doc': 'word',
+    '.docx': 'word',
+}
+
 def get_file_type(file_path: str) -> str:
     """Determine file type by extension."""
-    ext = os.path.splitext(file_path)[1].lower()
-    if ext in ['.pdf']:
-        return 'pdf'
-    elif ext in ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp']:
-        return 'image'
-    elif ext in ['.doc', '.docx']:
-        return 'word'
-    else:
-        return 'unknown'
-
-def extract_text_with_openai(file_path: str, openai_client=None) -> str:
+    return _EXT_TYPE.get(os.path.splitext(file_path)[1].lower(), 'unknown')
+
+# Images above this size are re-encoded as JPEG before OCR; text recognition
+# doesn't need lossless pixels and the payload is base64-inflated on the wire
+OCR_IMAGE_MAX_BYTES = 1024 * 1024
+OCR_JPEG_QUALITY = 85
+
+def _compress_image_for_ocr(content: bytes) -> bytes:
+    """Return a smaller JPEG encoding of a large image, or the original bytes if that isn't possible or worthwhile."""
+    if len(content) <= OCR_IMAGE_MAX_BYTES or not PILLOW_AVAILABLE:
+        return content
+    try:
+        with _pil_image().open(io.BytesIO(content)) as img:
+            buf = io.BytesIO()
+            img.convert("RGB").save(buf, format="JPEG", quality=OCR_JPEG_QUALITY, optimize=True)
+        compressed = buf.getvalue()
+        if len(compressed) >= len(content):
+            return content
+        logger.info(f"Compressed image for OCR from {len(content)} to {len(compressed)} bytes")
+        return compressed
+    except Exception as e:
+        logger.warning(f"Could not compress image for OCR: {e}")
+        return content
+
+def _openai_vision_content_part(file_path: str, file_bytes: Optional[bytes] = None) -> Dict[str, Any]:
+    """
+    The message content part carrying the document for OpenAI Vision. PDFs go
+    whole as a "file" part, so every page is read; images go as an image_url.
+    """
+    if get_file_type(file_path) == 'pdf':
+        if file_bytes is None:
+            with open(file_path, "rb") as f:
+                file_bytes = f.read()
+        return {"type": "file", "file": {
+            "filename": os.path.basename(file_path),
+            "file_data": f"data:application/pdf;base64,{base64.b64encode(file_bytes).decode('ascii')}"
+        }}
+
+    content_type, file_b64 = _encode_image_for_openai_vision(file_path, file_bytes)
+    return {"type": "image_url", "image_url": {"url": f"data:{content_type};base64,{file_b64}"}}
+
+def _encode_image_for_openai_vision(file_path: str, file_bytes: Optional[bytes] = None) -> Tuple[str, str]:
+    """Return (content_type, base64 payload) of an image for the Vision image_url."""
+    content_type, _ = mimetypes.guess_type(file_path)
+    content_type = content_type or "application/octet-stream"
+    if file_bytes is None and os.path.getsize(file_path) <= OCR_IMAGE_MAX_BYTES:
+        # Small enough to send as-is: encode straight from the mapped file
+        # rather than holding an extra bytes copy
+        with open(file_path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                file_b64 = base64.b64encode(mm).decode('ascii')
+        return content_type, file_b64
+
+    if file_bytes is None:
+        with open(file_path, "rb") as f:
+            file_bytes = f.read()
+    image_bytes = _compress_image_for_ocr(file_bytes)
+    if image_bytes is not file_bytes:
+        content_type = "image/jpeg"
+    return content_type, base64.b64encode(image_bytes).decode('ascii')
+
+def _openai_vision_extract(openai_client, model: str, content_part: Dict[str, Any]) -> str:
+    response = openai_client.chat.completions.create(
+        model=model, 
+        messages=[
+            {"role": "system", "content": "You are a helpful assistant that extracts text content from resume/CV documents."},
+            {"role": "user", "content": [
+                {"type": "text", "text": "Extract and organize all text content from this CV/resume document. Include all sections like personal info, education, experience, skills, etc. in a clean, structured format."},
+                content_part
+            ]}
+        ],
+        max_tokens=4000
+    )
+    return response.choices[0].message.content
+
+def extract_text_with_openai(file_path: str, openai_client=None, file_bytes: Optional[bytes] = None) -> str:
     """Extract text from document using OpenAI's Vision API."""
     if not openai_client:
         logger.warning("OpenAI client not provided, can't use OpenAI Vision API")
@@ -137,36 +326,11 @@ def extract_text_with_openai(file_path: str, openai_client=None) -> str:
     try:
         logger.info(f"Extracting text with OpenAI Vision API: {file_path}")
 
-        file_ext = os.path.splitext(file_path)[1].lower()
-        
-        if file_ext in ['.pdf']:
-            content_type = "application/pdf"
-        elif file_ext in ['.jpg', '.jpeg']:
-            content_type = "image/jpeg"
-        elif file_ext in ['.png']:
-            content_type = "image/png"
-        else:
-            content_type = "application/octet-stream"
-        
-        with open(file_path, "rb") as f:
-            file_content = f.read()
-            
-        file_b64 = base64.b64encode(file_content).decode('utf-8')
+        # Encoded once and reused by the gpt-4.1 retry below
+        content_part = _openai_vision_content_part(file_path, file_bytes)
         
         try:
-            response = openai_client.chat.completions.create(
-                model="gpt-4.1-mini", 
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant that extracts text content from resume/CV documents."},
-                    {"role": "user", "content": [
-                        {"type": "text", "text": "Extract and organize all text content from this CV/resume document. Include all sections like personal info, education, experience, skills, etc. in a clean, structured format."},
-                        {"type": "image_url", "image_url": {"url": f"data:{content_type};base64,{file_b64}"}}
-                    ]}
-                ],
-                max_tokens=4000
-            )
-            
-            extracted_text = response.choices[0].message.content
+            extracted_text = _openai_vision_extract(openai_client, "gpt-4.1-mini", content_part)
 
             if len(extracted_text.strip()) < 100:
                 logger.info("Minimal text extracted with gpt-4.1-mini, trying with full gpt-4.1 model")
@@ -178,19 +342,7 @@ def extract_text_with_openai(file_path: str, openai_client=None) -> str:
         except Exception as mini_err:
             logger.info(f"Trying extraction with full gpt-4.1 model: {str(mini_err)}")
             
-            response = openai_client.chat.completions.create(
-                model="gpt-4.1", 
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant that extracts text content from resume/CV documents."},
-                    {"role": "user", "content": [
-                        {"type": "text", "text": "Extract and organize all text content from this CV/resume document. Include all sections like personal info, education, experience, skills, etc. in a clean, structured format."},
-                        {"type": "image_url", "image_url": {"url": f"data:{content_type};base64,{file_b64}"}}
-                    ]}
-                ],
-                max_tokens=4000
-            )
-            
-            extracted_text = response.choices[0].message.content
+            extracted_text = _openai_vision_extract(openai_client, "gpt-4.1", content_part)
             logger.info(f"Successfully extracted {len(extracted_text)} characters with OpenAI gpt-4.1")
             return extracted_text
             
@@ -198,104 +350,280 @@ def extract_text_with_openai(file_path: str, openai_client=None) -> str:
         logger.error(f"Error extracting text with OpenAI Vision API: {e}")
         return ""
 
-def extract_text_from_document(file_path: str, vision_client=None, openai_client=None) -> str:
+# Next to /app/uploads, where the CVs themselves live, rather than under
+# whatever directory the server happened to start in
+TEXT_CACHE_DIR = os.getenv("TEXT_CACHE_DIR", "/app/cache/pdf_text")
+# Entries older than this are removed, then the oldest until the cache fits
+TEXT_CACHE_MAX_AGE_SECONDS = int(os.getenv("TEXT_CACHE_MAX_AGE_SECONDS", str(60 * 60 * 24 * 30)))
+TEXT_CACHE_MAX_BYTES = int(os.getenv("TEXT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+TEXT_CACHE_SWEEP_INTERVAL_SECONDS = 60 * 60
+
+_text_cache_last_sweep = 0.0
+
+def get_cached_text(digest: str) -> Optional[str]:
+    """Return previously extracted text for this fingerprint, if any."""
+    cache_path = os.path.join(TEXT_CACHE_DIR, f"{digest}.txt")
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Could not read extraction cache {cache_path}: {e}")
+        return None
+
+def _write_cache_file(path: str, data: str) -> None:
+    """Write via a temp file and rename, so readers never see a partial file."""
+    fd, temp_path = tempfile.mkstemp(dir=TEXT_CACHE_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+def _sweep_text_cache() -> None:
     """
-    Extract text from a document file using multiple methods and select the best result.
-    Tries various extraction techniques and returns the one with the most content.
+    Drop expired entries, then the oldest ones while the cache is over its size
+    limit. An entry's text and metadata sidecar are removed together.
+    """
+    global _text_cache_last_sweep
+    now = time.time()
+    if now - _text_cache_last_sweep < TEXT_CACHE_SWEEP_INTERVAL_SECONDS:
+        return
+    _text_cache_last_sweep = now
+
+    entries: Dict[str, list] = {}
+    with os.scandir(TEXT_CACHE_DIR) as it:
+        for entry in it:
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                continue
+            stem = entry.name.split(".", 1)[0]
+            newest, size, paths = entries.get(stem, (0.0, 0, []))
+            entries[stem] = [max(newest, st.st_mtime), size + st.st_size, paths + [entry.path]]
+
+    total = sum(size for _, size, _ in entries.values())
+    for mtime, size, paths in sorted(entries.values()):
+        if now - mtime <= TEXT_CACHE_MAX_AGE_SECONDS and total <= TEXT_CACHE_MAX_BYTES:
+            break
+        for path in paths:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        total -= size
+
+def save_cached_text(digest: str, text: str, method: str) -> None:
+    """Write-through an accepted extraction result plus a small metadata sidecar."""
+    try:
+        os.makedirs(TEXT_CACHE_DIR, exist_ok=True)
+        _write_cache_file(os.path.join(TEXT_CACHE_DIR, f"{digest}.txt"), text)
+        _write_cache_file(
+            os.path.join(TEXT_CACHE_DIR, f"{digest}.json"),
+            json.dumps({"method": method, "length": len(text)})
+        )
+        _sweep_text_cache()
+    except Exception as e:
+        logger.warning(f"Could not write extraction cache for {digest}: {e}")
+
+# Minimum bar an extractor's output must clear before we stop trying the
+# more expensive methods (Vision/OpenAI are network calls)
+MIN_QUALITY_CHARS = 400
+MIN_ALPHA_RATIO = 0.5
+
+def is_high_quality_text(text: str) -> bool:
+    """Cheap heuristic: enough characters and mostly letters rather than layout garbage."""
+    stripped = text.strip()
+    if len(stripped) < MIN_QUALITY_CHARS:
+        return False
+    sample = stripped[:2000]
+    alpha_ratio = sum(c.isalpha() for c in sample) / len(sample)
+    return alpha_ratio > MIN_ALPHA_RATIO
+
+# A PDF whose text layer beats both bars is not a scan, so paying for OCR is wasted
+OCR_MIN_LOCAL_CHARS = 500
+OCR_MIN_ALPHA_RATIO = 0.4
+
+def needs_ocr(extraction_results: list) -> bool:
+    """Decide from the local extractors' output whether a PDF still needs Vision/OpenAI OCR."""
+    if not extraction_results:
+        return True
+    top_text, _, local_best = max(extraction_results, key=lambda result: result[2])
+    if local_best < OCR_MIN_LOCAL_CHARS:
+        return True
+    alpha_ratio = sum(ch.isalpha() for ch in top_text) / max(len(top_text), 1)
+    return alpha_ratio < OCR_MIN_ALPHA_RATIO
+
+VISION_MAX_WORKERS = 8
+# batch_annotate_images accepts at most 16 images per request
+VISION_BATCH_SIZE = 16
+
+def _vision_batch_text(image_paths: List[str], vision_client, contents: Optional[List[bytes]] = None) -> List[str]:
+    """
+    OCR up to VISION_BATCH_SIZE images in one Vision RPC, returning '' for pages that failed.
+    Pass contents when the image bytes are already in memory to skip reading them from disk.
+    """
+    try:
+        if contents is None:
+            contents = []
+            for img_path in image_paths:
+                with open(img_path, "rb") as f:
+                    contents.append(f.read())
+
+        requests = []
+        for content in map(_compress_image_for_ocr, contents):
+            requests.append(vision.AnnotateImageRequest(
+                image=vision.Image(content=content),
+                features=[vision.Feature(type_=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)]
+            ))
+
+        batch_response = vision_client.batch_annotate_images(requests=requests)
+
+        page_texts = []
+        for img_path, response in zip(image_paths, batch_response.responses):
+            if response.error.message:
+                logger.error(f"Vision API error for {img_path}: {response.error.message}")
+                page_texts.append("")
+            else:
+                page_texts.append(response.full_text_annotation.text or "")
+        return page_texts
+    except Exception as e:
+        logger.error(f"Error processing images {image_paths}: {e}")
+        return [""] * len(image_paths)
+
+def extract_text_with_google_vision(file_path: str, vision_client, file_type: str = 'image', file_bytes: Optional[bytes] = None) -> str:
+    """
+    Extract text using Google Vision, rasterizing PDFs to page images first.
+    For image files, pass file_bytes to reuse an already-read upload.
+    """
+    if file_type != 'pdf':
+        contents = [file_bytes] if file_bytes is not None else None
+        return _vision_batch_text([file_path], vision_client, contents)[0]
+
+    logger.info("Attempting to extract text using PDF to image conversion and Vision API")
+    # Pages go to Vision in batches of up to 16 per RPC; anything longer fans the
+    # batches out concurrently. The executor is shut down (waiting on every batch)
+    # before the temp directory is removed, and map() preserves page order.
+    with tempfile.TemporaryDirectory() as temp_dir, \
+            ThreadPoolExecutor(max_workers=VISION_MAX_WORKERS) as executor:
+        image_paths = convert_pdf_to_images(file_path, temp_dir)
+        batches = [image_paths[i:i + VISION_BATCH_SIZE] for i in range(0, len(image_paths), VISION_BATCH_SIZE)]
+        batch_texts = list(executor.map(lambda batch: _vision_batch_text(batch, vision_client), batches))
+
+    page_texts = [page_text for batch in batch_texts for page_text in batch]
+    return "".join(page_text + "\n\n" for page_text in page_texts if page_text)
+
+def _failed_extraction_message(file_path: str) -> str:
+    return f"Failed to extract text from file: {os.path.basename(file_path)}. The file may be corrupt, empty, or in an unsupported format."
+
+def _prepare_document(file_path: str, file_bytes: Optional[bytes] = None) -> Tuple[str, bytes, Optional[str], Optional[str]]:
+    """
+    Read the file once (unless the caller already holds its bytes) and consult the
+    extraction cache. Returns (file_type, file_bytes, digest, early_result); when
+    early_result is not None the caller should return it as-is (cache hit or
+    unreadable file).
     """
-    if not os.path.exists(file_path):
-        logger.error(f"File not found: {file_path}")
-        return f"File not found: {file_path}"
-        
     file_type = get_file_type(file_path)
     logger.info(f"Extracting text from {file_type} file: {file_path}")
-    
-    extraction_results = []
-    
-    if file_type == 'pdf':
-        # Try PyPDF2
-        if PYPDF2_AVAILABLE:
-            text = extract_text_from_pdf_with_pypdf2(file_path)
-            if text:
-                extraction_results.append((text, "PyPDF2", len(text)))
-        
-        # Try PyMuPDF
-        if PYMUPDF_AVAILABLE:
-            text = extract_text_with_pymupdf(file_path)
-            if text:
-                extraction_results.append((text, "PyMuPDF", len(text)))
-        
-        # Try pdftotext utility
-        if check_for_pdftotext():
-            text = extract_text_with_pdftotext(file_path)
-            if text:
-                extraction_results.append((text, "pdftotext", len(text)))
-        
-        # Try Vision API
-        if PDF2IMAGE_AVAILABLE and vision_client:
-            logger.info("Attempting to extract text using PDF to image conversion and Vision API")
-            image_paths = convert_pdf_to_images(file_path)
-            combined_text = ""
-            
-            for img_path in image_paths:
-                try:
-                    
-                    with open(img_path, "rb") as f:
-                        content = f.read()
-                    
-                    from google.cloud import vision
-                    image = vision.Image(content=content)
-                    response = vision_client.document_text_detection(image=image)
-                    
-                    if response.error.message:
-                        logger.error(f"Vision API error: {response.error.message}")
-                        continue
-                        
-                    page_text = response.full_text_annotation.text
-                    combined_text += page_text + "\n\n"
-                    
-                except Exception as e:
-                    logger.error(f"Error processing image {img_path}: {e}")
-            
-            if combined_text:
-                extraction_results.append((combined_text, "Google Vision", len(combined_text)))
-        
-        # Try OpenAI Vision API
-        if openai_client:
-            openai_text = extract_text_with_openai(file_path, openai_client)
-            if openai_text:
-                extraction_results.append((openai_text, "OpenAI Vision", len(openai_text)))
-                
-    elif file_type == 'image':
-        if vision_client:
-            try:
-                with open(file_path, "rb") as f:
-                    content = f.read()
-                
-                from google.cloud import vision
-                image = vision.Image(content=content)
-                response = vision_client.document_text_detection(image=image)
-                
-                if not response.error.message:
-                    extracted_text = response.full_text_annotation.text
-                    if extracted_text:
-                        extraction_results.append((extracted_text, "Google Vision", len(extracted_text)))
-            except Exception as e:
-                logger.error(f"Error with Google Vision: {e}")
-                
-        if openai_client:
-            openai_text = extract_text_with_openai(file_path, openai_client)
-            if openai_text:
-                extraction_results.append((openai_text, "OpenAI Vision", len(openai_text)))
 
+    if not os.path.exists(file_path):
+        logger.error(f"File not found: {file_path}")
+        return file_type, b"", None, f"File not found: {file_path}"
+
+    # Read once; the digest, PyMuPDF, PyPDF2, OpenAI and the direct read all share these bytes
+    if file_bytes is None:
+        try:
+            with open(file_path, "rb") as f:
+                file_bytes = f.read()
+        except Exception as e:
+            logger.error(f"Could not read {file_path}: {e}")
+            return file_type, b"", None, _failed_extraction_message(file_path)
+
+    digest = None
     try:
-        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-            text = f.read()
+        digest = hashlib.blake2b(file_bytes, digest_size=16).hexdigest()
+        cached_text = get_cached_text(digest)
+        if cached_text is not None:
+            logger.info(f"Using cached extraction for {file_path} ({len(cached_text)} characters)")
+            return file_type, file_bytes, digest, cached_text
+    except Exception as e:
+        logger.warning(f"Could not fingerprint {file_path}, skipping extraction cache: {e}")
+
+    return file_type, file_bytes, digest, None
+
+@dataclass(frozen=True, slots=True)
+class Extractor:
+    """A text extraction method. Lower tiers are cheaper; tier >= OCR_TIER means a paid network OCR call."""
+    name: str
+    available: Callable[[Any, Any], bool]
+    run: Callable[[str, bytes, Any, Any], str]
+    tier: int
+
+LOCAL_TIER = 0
+OCR_TIER = 1
+
+# Per file type, in priority order (the sort on tier below is stable)
+EXTRACTORS: Dict[str, List[Extractor]] = {
+    'pdf': [
+        Extractor("pypdfium2", lambda vc, oc: PYPDFIUM2_AVAILABLE,
+                  lambda path, data, vc, oc: extract_text_with_pdfium(path, data), LOCAL_TIER),
+        Extractor("PyMuPDF", lambda vc, oc: PYMUPDF_AVAILABLE,
+                  lambda path, data, vc, oc: extract_text_with_pymupdf(path, data), LOCAL_TIER),
+        Extractor("pdftotext", lambda vc, oc: check_for_pdftotext(),
+                  lambda path, data, vc, oc: extract_text_with_pdftotext(path), LOCAL_TIER),
+        Extractor("PyPDF2", lambda vc, oc: PYPDF2_AVAILABLE,
+                  lambda path, data, vc, oc: extract_text_from_pdf_with_pypdf2(path, data), LOCAL_TIER),
+        Extractor("Google Vision", lambda vc, oc: PDF2IMAGE_AVAILABLE and VISION_AVAILABLE and vc is not None,
+                  lambda path, data, vc, oc: extract_text_with_google_vision(path, vc, 'pdf'), OCR_TIER),
+        Extractor("OpenAI Vision", lambda vc, oc: oc is not None,
+                  lambda path, data, vc, oc: extract_text_with_openai(path, oc, data), OCR_TIER),
+    ],
+    'image': [
+        Extractor("Google Vision", lambda vc, oc: VISION_AVAILABLE and vc is not None,
+                  lambda path, data, vc, oc: extract_text_with_google_vision(path, vc, 'image', data), OCR_TIER),
+        Extractor("OpenAI Vision", lambda vc, oc: oc is not None,
+                  lambda path, data, vc, oc: extract_text_with_openai(path, oc, data), OCR_TIER),
+    ],
+}
+
+def _build_extractors(file_path: str, file_type: str, file_bytes: bytes, vision_client, openai_client) -> list:
+    """List (method, extract, is_ocr) for the available extractors of this file type, cheapest first."""
+    return [
+        (
+            ex.name,
+            functools.partial(ex.run, file_path, file_bytes, vision_client, openai_client),
+            ex.tier >= OCR_TIER
+        )
+        for ex in sorted(EXTRACTORS.get(file_type, []), key=lambda ex: ex.tier)
+        if ex.available(vision_client, openai_client)
+    ]
+
+def _accept_extraction(digest: Optional[str], text: str, method: str) -> str:
+    logger.info(f"Selected extraction method: {method} with {len(text)} characters (passed quality check)")
+    if digest:
+        save_cached_text(digest, text, method)
+    return text
+
+def _select_best_extraction(file_path: str, file_type: str, file_bytes: bytes, extraction_results: list) -> str:
+    """
+    Fallback when no extractor passed the quality bar: keep the longest result.
+    It is not cached, so a later attempt (e.g. once OCR is configured) can do better.
+    """
+    # Decoding a binary PDF/image/Word file as UTF-8 only yields garbage, so the
+    # direct read is reserved for extensions we don't otherwise understand
+    if file_type == 'unknown':
+        try:
+            text = file_bytes.decode('utf-8', errors='ignore')
             if text and len(text.strip()) > 20:
                 extraction_results.append((text, "Direct Text Read", len(text)))
-    except Exception as e:
-        logger.debug(f"Direct text read failed: {e}")
-    
+        except Exception as e:
+            logger.debug(f"Direct text read failed: {e}")
     
     if extraction_results:
         logger.info(f"Text extracted using {len(extraction_results)} methods:")
@@ -309,4 +637,62 @@ def extract_text_from_document(file_path: str, vision_client=None, openai_client
         return best_text
     
     logger.error(f"All text extraction methods failed for file: {file_path}")
-    return f"Failed to extract text from file: {os.path.basename(file_path)}. The file may be corrupt, empty, or in an unsupported format."
\ No newline at end of file
+    return _failed_extraction_message(file_path)
+
+def extract_text_from_document(file_path: str, vision_client=None, openai_client=None) -> str:
+    """
+    Extract text from a document file using multiple methods and select the best result.
+    Extractors run cheapest first and we stop as soon as one returns high-quality text;
+    if none does, the result with the most content wins.
+    """
+    file_type, file_bytes, digest, early_result = _prepare_document(file_path)
+    if early_result is not None:
+        return early_result
+
+    extraction_results = []
+    for method, extract, is_ocr in _build_extractors(file_path, file_type, file_bytes, vision_client, openai_client):
+        if is_ocr and file_type == 'pdf' and not needs_ocr(extraction_results):
+            logger.info(f"Skipping {method}: the PDF already has a usable text layer")
+            continue
+        text = extract()
+        if not text:
+            continue
+        if is_high_quality_text(text):
+            return _accept_extraction(digest, text, method)
+        extraction_results.append((text, method, len(text)))
+
+    return _select_best_extraction(file_path, file_type, file_bytes, extraction_results)
+
+async def extract_text_from_document_async(file_path: str, vision_client=None, openai_client=None,
+                                           file_bytes: Optional[bytes] = None) -> str:
+    """
+    Async counterpart of extract_text_from_document for use inside request handlers.
+    Extractors run one at a time off the event loop, cheapest first, stopping at
+    the first good result, as in the sync version. Running them side by side
+    would pay for every parser (a started executor call can't be cancelled),
+    bill OCR twice, and overlap calls into PDFium/MuPDF, which aren't thread-safe.
+    Pass file_bytes when the contents are already in memory (e.g. a fresh upload)
+    to skip reading the file back; file_path must still exist for the path-based
+    tools (pdftotext, pdf2image).
+    """
+    file_type, file_bytes, digest, early_result = await asyncio.to_thread(_prepare_document, file_path, file_bytes)
+    if early_result is not None:
+        return early_result
+
+    extraction_results = []
+    for method, extract, is_ocr in _build_extractors(file_path, file_type, file_bytes, vision_client, openai_client):
+        if is_ocr and file_type == 'pdf' and not needs_ocr(extraction_results):
+            logger.info(f"Skipping {method}: the PDF already has a usable text layer")
+            continue
+        try:
+            text = await asyncio.to_thread(extract)
+        except Exception as e:
+            logger.error(f"{method} extraction failed: {e}")
+            continue
+        if not text:
+            continue
+        if is_high_quality_text(text):
+            return await asyncio.to_thread(_accept_extraction, digest, text, method)
+        extraction_results.append((text, method, len(text)))
+
+    return await asyncio.to_thread(_select_best_extraction, file_path, file_type, file_bytes, extraction_results)
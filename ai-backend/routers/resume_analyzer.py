@@ -1,18 +1,28 @@
 import os
+import re
+import stat
+import time
 import uuid
 import logging
+import asyncio
 import json
 import base64
+import hashlib
 import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Dict, Any, Optional
 from datetime import datetime
-from fastapi import APIRouter, File, UploadFile, Form, HTTPException, status, Request, BackgroundTasks, Body
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi import APIRouter, File, UploadFile, Form, HTTPException, status, Request, BackgroundTasks, Body, Depends
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse, ORJSONResponse
 from pydantic import BaseModel, Field
 from bson import ObjectId
-from .pdf_extraction import extract_text_from_document
+from .pdf_extraction import extract_text_from_document_async
+from .cv_utils import mark_cv_used, TTLCache, decode_token
+from .interviewprep import async_openai_client
 from dotenv import load_dotenv
 import motor.motor_asyncio
+import aiofiles
+import aiofiles.os
 import jwt
 
 # Configure logging
@@ -26,11 +36,26 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY", "NE60hAlMyF6wVlOt5+VDKpaU/I6FJ4Oa5df1gpG/MTg=")
 MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://host.docker.internal:27017")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4.1-mini-2025-04-14")
+UPLOAD_CHUNK_SIZE = 1 << 20  # 1 MiB
+# Uploads are held in memory for extraction, so their size is capped
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 << 20)))
 
-logger.info(f"Using MongoDB URI: {MONGODB_URI}")
-logger.info(f"Using OpenAI model: {OPENAI_MODEL}")
+# Resume text beyond this many tokens is cut before prompting, so oversized
+# CVs can't overflow the context window and fail through every retry
+RESUME_MAX_PROMPT_TOKENS = int(os.getenv("RESUME_MAX_PROMPT_TOKENS", "6000"))
+
+# Per-task completion budgets; generation time scales with output tokens
+ANALYZE_MAX_TOKENS = 1200
+SUGGEST_ROLES_MAX_TOKENS = 400
+OPTIMIZE_MAX_TOKENS = 2000
+
+logger.info("Using MongoDB URI: %s", MONGODB_URI)
+logger.info("Using OpenAI model: %s", OPENAI_MODEL)
 
 # Initialize OpenAI client
+# openai_client (sync) is handed to the text extraction module, which runs in
+# worker threads; chat calls made from handlers go through the pooled
+# async_openai_client shared from interviewprep
 try:
     import openai
     from openai import OpenAI
@@ -53,6 +78,50 @@ except ImportError:
     OpenAI = None
     openai_client = None
 
+# Chat completion dispatch, resolved once instead of on every call
+OPENAI_LEGACY_API = openai is not None and not hasattr(openai, "OpenAI")
+
+async def _legacy_chat_completion(**kwargs):
+    # Legacy OpenAI API has no async client, so keep it off the loop
+    return await asyncio.to_thread(openai.ChatCompletion.create, **kwargs)
+
+async def _modern_chat_completion(**kwargs):
+    return await async_openai_client.chat.completions.create(**kwargs)
+
+_create_chat_completion = _legacy_chat_completion if OPENAI_LEGACY_API else _modern_chat_completion
+
+# tiktoken gives exact token counts for prompt truncation; without it a
+# characters-per-token estimate is used
+try:
+    import tiktoken
+    try:
+        token_encoding = tiktoken.encoding_for_model(OPENAI_MODEL)
+    except KeyError:
+        token_encoding = tiktoken.get_encoding("o200k_base")
+except ImportError:
+    logger.warning("tiktoken not installed, estimating prompt tokens from length")
+    token_encoding = None
+
+# ReportLab renders optimized resumes; without it they are saved as plain text
+try:
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib import colors
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    REPORTLAB_AVAILABLE = True
+except ImportError:
+    logger.warning("ReportLab not installed, optimized resumes will be saved as text")
+    REPORTLAB_AVAILABLE = False
+
+# orjson serializes the larger analysis payloads much faster than stdlib json
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    logger.warning("orjson not installed, responses will use the standard JSON encoder")
+    ORJSON_AVAILABLE = False
+FAST_JSON_RESPONSE = ORJSONResponse if ORJSON_AVAILABLE else JSONResponse
+
 # Initialize Google Vision client
 try:
     from google.cloud import vision
@@ -69,26 +138,161 @@ except ImportError:
     vision = None
     vision_client = None
 
-# Set up MongoDB
-try:
-    client = motor.motor_asyncio.AsyncIOMotorClient(MONGODB_URI)
-    db = client["futureforceai"]
-    resumes_col = db["resumes"]
-    users_col = db["users"]
-    optimized_resumes_col = db["optimized_resumes"]
-    logger.info("MongoDB connection established")
-except Exception as e:
-    logger.error(f"Failed to connect to MongoDB: {e}")
-    client = None
-    db = None
-    resumes_col = None
-    users_col = None
-    optimized_resumes_col = None
+# MongoDB handles. The client is created on startup, inside the worker's running
+# event loop, rather than at import time; until then these stay None and the
+# endpoints answer 503 like they do when Mongo is unreachable.
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "10"))
+client = None
+db = None
+resumes_col = None
+cvs_col = None
+users_col = None
+optimized_resumes_col = None
+analysis_cache_col = None
+resume_text_bucket = None
+
+# How long cached LLM results (analysis, role suggestions, optimizations) are kept
+ANALYSIS_CACHE_TTL_SECONDS = int(os.getenv("ANALYSIS_CACHE_TTL_SECONDS", "86400"))
 
 # Create API router
 router = APIRouter()
 logger.info("API Router created")
 
+@router.on_event("startup")
+async def connect_mongo():
+    """Create the Motor client bound to this worker's event loop"""
+    global client, db, resumes_col, cvs_col, users_col, optimized_resumes_col, analysis_cache_col, resume_text_bucket
+    try:
+        client = motor.motor_asyncio.AsyncIOMotorClient(
+            MONGODB_URI,
+            maxPoolSize=MONGO_MAX_POOL_SIZE,
+            minPoolSize=MONGO_MIN_POOL_SIZE,
+            serverSelectionTimeoutMS=3000,
+            appname="futureforceai"
+        )
+        db = client["futureforceai"]
+        resumes_col = db["resumes"]
+        cvs_col = db["cvs"]
+        users_col = db["users"]
+        optimized_resumes_col = db["optimized_resumes"]
+        analysis_cache_col = db["analysis_cache"]
+        # Extracted resume text lives in GridFS; resume docs keep only a reference
+        resume_text_bucket = motor.motor_asyncio.AsyncIOMotorGridFSBucket(db, bucket_name="resume_texts")
+        logger.info("MongoDB connection established")
+    except Exception as e:
+        logger.error("Failed to connect to MongoDB: %s", e)
+        return
+    await create_analysis_cache_index()
+    await create_resume_lookup_indexes()
+
+@router.on_event("shutdown")
+async def close_mongo():
+    if client is not None:
+        client.close()
+
+@router.on_event("shutdown")
+async def shutdown_pdf_pool():
+    if _pdf_pool is not None:
+        _pdf_pool.shutdown(wait=False, cancel_futures=True)
+
+async def create_analysis_cache_index():
+    """Expire cached LLM results automatically via a TTL index"""
+    if analysis_cache_col is None:
+        return
+    try:
+        await analysis_cache_col.create_index("createdAt", expireAfterSeconds=ANALYSIS_CACHE_TTL_SECONDS)
+    except Exception as e:
+        logger.error("Error creating analysis cache index: %s", e)
+
+# Resume lookups always filter on userId plus an ID field; compound indexes keep
+# them point queries. (collection, keys) pairs; create_index is a no-op if present.
+RESUME_LOOKUP_INDEXES = [
+    ("resumes", [("userId", 1), ("_id", 1)]),
+    ("resumes", [("userId", 1), ("fileId", 1)]),
+    ("resumes", [("userId", 1), ("uploadedAt", -1)]),
+    ("resumes", [("userId", 1), ("contentHash", 1)]),
+    ("cvs", [("userId", 1), ("_id", 1)]),
+    ("cvs", [("userId", 1), ("fileId", 1)]),
+    ("cvs", [("userId", 1), ("uploadedAt", -1)]),
+    ("optimized_resumes", [("userId", 1), ("createdAt", -1)]),
+]
+
+async def create_resume_lookup_indexes():
+    """Ensure the compound indexes used by the per-user resume lookups exist"""
+    if db is None:
+        return
+    for collection_name, keys in RESUME_LOOKUP_INDEXES:
+        try:
+            await db[collection_name].create_index(keys, background=True)
+        except Exception as e:
+            logger.error("Error creating index %s on %s: %s", keys, collection_name, e)
+
+# Resume text seen by the analyze endpoints, so the optimize call that normally
+# follows can skip re-reading the resume from Mongo
+RESUME_TEXT_CACHE_TTL_SECONDS = 900
+RESUME_TEXT_CACHE_MAX_SIZE = 1000
+_resume_text_cache = TTLCache(RESUME_TEXT_CACHE_MAX_SIZE)
+
+def remember_resume_text(user_id: str, resume_id: str, text: str) -> None:
+    _resume_text_cache.set((user_id, resume_id), text, RESUME_TEXT_CACHE_TTL_SECONDS)
+
+def recall_resume_text(user_id: str, resume_id: str) -> Optional[str]:
+    return _resume_text_cache.get((user_id, resume_id))
+
+async def get_current_user_id(request: Request) -> str:
+    """Dependency resolving the authenticated user's ID from the token cookie"""
+    token = request.cookies.get("token")
+    if not token:
+        logger.warning("No authentication token found")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Authentication required"
+        )
+        
+    try:
+        payload = decode_token(token, SECRET_KEY)
+    except jwt.PyJWTError as e:
+        logger.error("JWT decode error: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=f"Invalid token: {str(e)}"
+        )
+    
+    user_id = payload.get("userId")
+    if not user_id:
+        logger.warning("Invalid token: missing userId")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication token"
+        )
+    logger.debug("User authenticated: %s", user_id)
+    return user_id
+
+def _require_services(collections_ok: bool, service_name: str) -> None:
+    if not collections_ok:
+        logger.error("MongoDB not connected")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database unavailable"
+        )
+    if openai is None or openai_api_key is None:
+        logger.error("OpenAI API not configured")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"{service_name} service unavailable"
+        )
+
+async def require_analysis_user(user_id: str = Depends(get_current_user_id)) -> str:
+    """Authenticated user, with the resumes collection and OpenAI confirmed available"""
+    _require_services(resumes_col is not None, "Analysis")
+    return user_id
+
+async def require_optimization_user(user_id: str = Depends(get_current_user_id)) -> str:
+    """As require_analysis_user, but also needs the optimized_resumes collection"""
+    _require_services(resumes_col is not None and optimized_resumes_col is not None, "Optimization")
+    return user_id
+
 # Pydantic Models
 class ResumeAnalysisRequest(BaseModel):
     resume_id: Optional[str] = None
@@ -100,11 +304,14 @@ class ResumeAnalysisResponse(BaseModel):
     format_issues: List[str]
     recommendations: List[str]
     sections: dict
+    resume_id: Optional[str] = None
+    suggested_roles: Optional[List[str]] = None
 
 class OptimizeResumeRequest(BaseModel):
     resume_id: str
     target_role: str
     analysis: dict
+    resume_text: Optional[str] = None
 
 class RoleSource(BaseModel):
     role: str
@@ -114,36 +321,161 @@ class SuggestedRolesResponse(BaseModel):
     suggested_roles: List[str]
     resume_id: Optional[str] = None
 
+# Prompt templates. These are kept static (no f-strings, no timestamps) and the
+# per-request resume/role text always goes at the end of the user message, so
+# the same input always produces the same prompt. The fixed instructions are a
+# few hundred tokens, well below the 1024-token minimum for OpenAI's prompt
+# caching, so they are not expected to produce cache hits.
+DEFAULT_SYSTEM_MESSAGE = "You are a helpful assistant that provides responses in valid JSON format when requested. Always ensure JSON responses are properly formatted."
+
+ANALYZE_SYSTEM_MESSAGE = """
+You are an expert ATS (Applicant Tracking System) analyzer and resume optimizer. 
+Your task is to analyze a resume for a specific job role and provide insights on its ATS compatibility.
+
+For the resume and target role you are given:
+1. Give an ATS compatibility score from 0-100
+2. Identify keywords found in the resume that are relevant to the role
+3. List important keywords that are missing but would be relevant for this role
+4. Identify any formatting issues that could impact ATS scoring
+5. Provide specific recommendations to improve the resume
+6. Check which standard resume sections are present
+
+Provide your response in valid JSON format with the following structure:
+{
+    "ats_score": int,  // 0-100 score reflecting ATS compatibility
+    "keywords": {
+        "found": [list of keywords found in the resume relevant to the role],
+        "missing": [list of important keywords for the role that are missing]
+    },
+    "format_issues": [list of formatting issues that could impact ATS scoring],
+    "recommendations": [specific recommendations to improve the resume],
+    "sections": {
+        "contact_info": bool,
+        "summary": bool,
+        "experience": bool,
+        "education": bool,
+        "skills": bool,
+        "projects": bool,
+        "certifications": bool
+    }
+}
+"""
+
+SUGGEST_ROLES_SYSTEM_MESSAGE = """
+You are an expert resume analyzer and career advisor.
+Your task is to analyze a resume and suggest potential job roles that match the candidate's skills and experience.
+
+Based on the person's skills, experience, and qualifications, suggest 5-8 potential job roles that would be a good match.
+
+Consider:
+1. Technical skills and tools mentioned
+2. Years of experience and seniority level
+3. Industry background
+4. Educational qualifications
+
+Return your suggestions as a JSON object with a "roles" array of strings, each string being a job title.
+Example: {"roles": ["Software Engineer", "Full Stack Developer", "DevOps Engineer"]}
+
+Only return the JSON object, no other text.
+"""
+
+# Placeholder resume for documents whose text could not be extracted. The
+# filename is the only variable and comes last, after the fixed instructions.
+PLACEHOLDER_SYSTEM_MESSAGE = "You are an assistant that generates placeholder resume content based on a filename."
+
+PLACEHOLDER_PROMPT_TEMPLATE = """
+I need to generate placeholder content for a resume where the text extraction failed.
+
+Please generate a generic professional resume with the following sections:
+1. Summary/Objective
+2. Work Experience (2-3 positions)
+3. Education
+4. Skills
+5. Contact Information (use placeholder data)
+
+Make it realistic but generic so it can reasonably represent many professionals.
+
+The resume filename is: {filename}
+"""
+
+# Analysis and role suggestions in one call, for the upload flow that needs both
+ANALYZE_AND_SUGGEST_SYSTEM_MESSAGE = ANALYZE_SYSTEM_MESSAGE + """
+In the same JSON object, also include:
+    "suggested_roles": [5-8 job titles that match the candidate's skills, experience,
+                        seniority, industry background and education, independent of the target role]
+"""
+
+OPTIMIZE_SYSTEM_MESSAGE = """
+You are an expert resume writer and ATS optimization specialist.
+Your task is to rewrite and optimize a resume for a specific job role based on ATS analysis.
+
+Rewrite and optimize the resume to improve its ATS compatibility and effectiveness for the target role.
+
+Make sure to:
+1. Add missing keywords identified in the analysis
+2. Fix formatting issues
+3. Include all standard resume sections
+4. Maintain the person's actual experience and qualifications (don't fabricate anything)
+5. Use clear, concise, and professional language
+6. Organize content in a readable, ATS-friendly format
+
+Return the optimized resume text only, formatted professionally.
+"""
+
 # Helper Functions
-async def save_resume_to_disk(resume_file: UploadFile) -> str:
-    """Save the uploaded resume to local disk"""
+async def save_resume_to_disk(resume_file: UploadFile) -> tuple:
+    """
+    Stream the uploaded resume to local disk, returning (file_path, file_bytes,
+    content_hash). The bytes are handed straight to text extraction so it doesn't
+    read the file back; the blake2b content hash identifies re-uploads of the same file.
+    """
     try:
-        logger.info(f"Saving resume file: {resume_file.filename}")
+        logger.info("Saving resume file: %s", resume_file.filename)
         os.makedirs("uploads", exist_ok=True)
         file_ext = os.path.splitext(resume_file.filename)[1]
         file_name = f"{uuid.uuid4()}{file_ext}"
         file_path = os.path.join("uploads", file_name)
         
-        content = await resume_file.read()
-        with open(file_path, "wb") as f:
-            f.write(content)
+        chunks = []
+        size = 0
+        content_hash = hashlib.blake2b(digest_size=16)
+        async with aiofiles.open(file_path, "wb") as f:
+            while chunk := await resume_file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    break
+                await f.write(chunk)
+                chunks.append(chunk)
+                content_hash.update(chunk)
+        
+        if size > MAX_UPLOAD_BYTES:
+            await aiofiles.os.remove(file_path)
+            logger.warning("Rejected resume upload over %s bytes: %s", MAX_UPLOAD_BYTES, resume_file.filename)
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Resume file is too large (maximum {MAX_UPLOAD_BYTES // (1 << 20)} MB)"
+            )
             
-        logger.info(f"Resume saved to: {file_path}")
-        return file_path
+        logger.info("Resume saved to: %s (%s bytes)", file_path, size)
+        return file_path, b"".join(chunks), content_hash.hexdigest()
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error saving resume file: {e}")
+        logger.error("Error saving resume file: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error saving resume file: {str(e)}"
         )
 
-async def save_resume_to_db(user_id: str, file_path: str, filename: str, file_size: int, content_type: str, extracted_text: str) -> str:
+async def save_resume_to_db(user_id: str, file_path: str, filename: str, file_size: int, content_type: str, extracted_text: str,
+                            text_hash: str = None, content_hash: str = None) -> str:
     """Save resume metadata and extracted text to database"""
     try:
         if resumes_col is None:
             logger.error("MongoDB not available")
             return None
             
+        now = datetime.utcnow()
         resume_doc = {
             "userId": user_id,
             "filename": os.path.basename(file_path),
@@ -151,195 +483,311 @@ async def save_resume_to_db(user_id: str, file_path: str, filename: str, file_si
             "filePath": file_path,
             "fileSize": file_size,
             "contentType": content_type,
-            "extractedText": extracted_text,
-            "uploadedAt": datetime.utcnow(),
-            "lastUsed": datetime.utcnow()
+            "contentHash": content_hash,
+            "uploadedAt": now,
+            "lastUsed": now
         }
+        resume_doc.update(await store_resume_text(os.path.basename(file_path), extracted_text, text_hash))
         
         result = await resumes_col.insert_one(resume_doc)
         resume_id = str(result.inserted_id)
-        logger.info(f"Resume saved to database with ID: {resume_id}")
+        logger.info("Resume saved to database with ID: %s", resume_id)
         return resume_id
     except Exception as e:
-        logger.error(f"Error saving resume to database: {e}")
+        logger.error("Error saving resume to database: %s", e)
+        return None
+
+async def find_duplicate_upload(user_id: str, content_hash: str, file_path: str) -> tuple:
+    """
+    Look for an earlier upload of the same file by this user. On a usable hit the
+    new copy on disk is removed and (doc, text) is returned; otherwise (None, None).
+    """
+    if resumes_col is None:
+        return None, None
+    try:
+        doc = await resumes_col.find_one({"userId": user_id, "contentHash": content_hash}, RESUME_TEXT_PROJECTION)
+    except Exception as e:
+        logger.error("Error checking for a duplicate upload: %s", e)
+        return None, None
+    if doc is None:
+        return None, None
+    text = await load_resume_text(doc)
+    if not text or len(text.strip()) < 100:
+        return None, None
+    try:
+        await aiofiles.os.remove(file_path)
+    except OSError as e:
+        logger.warning("Could not remove duplicate upload %s: %s", file_path, e)
+    logger.info("Upload matches saved resume %s, reusing its text", doc["_id"])
+    return doc, text
+
+async def roles_for_saved_resume(doc: dict, text: str, text_hash: str) -> List[str]:
+    """Role suggestions stored on the document if they match its text, else fresh ones"""
+    stored = doc.get("suggestedRoles")
+    if stored and doc.get("suggestedRolesTextHash") == text_hash:
+        return stored
+    return await cached_suggest_roles(text, text_hash)
+
+async def stat_regular_file(path: Optional[str]) -> Optional[os.stat_result]:
+    """One non-blocking stat; the result if path is an existing regular file, else None"""
+    if not path:
+        return None
+    try:
+        st = await aiofiles.os.stat(path)
+    except OSError:
+        return None
+    return st if stat.S_ISREG(st.st_mode) else None
+
+def text_digest(text: str) -> str:
+    """sha256 of resume text, as stored in textHash"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+async def text_digest_async(text: str) -> str:
+    """text_digest in a worker thread; resume texts run to hundreds of KB"""
+    return await asyncio.to_thread(text_digest, text)
+
+async def store_resume_text(name: str, text: str, text_hash: str = None) -> dict:
+    """
+    Put extracted text in GridFS and return the fields that reference it from the
+    resume document. Falls back to storing the text inline if GridFS is unavailable.
+    """
+    data = text.encode("utf-8")
+    fields = {"textHash": text_hash or await text_digest_async(text), "textLen": len(text)}
+    if resume_text_bucket is not None:
+        try:
+            fields["textFileId"] = await resume_text_bucket.upload_from_stream(name, data)
+            return fields
+        except Exception as e:
+            logger.error("Error storing resume text in GridFS, keeping it inline: %s", e)
+    fields["extractedText"] = text
+    return fields
+
+async def replace_resume_text(collection, doc: dict, text: str, text_hash: str = None) -> None:
+    """
+    Store new text for an existing resume/cv document through store_resume_text,
+    so textHash, textLen and the GridFS reference stay in step with it. Clears
+    whichever of extractedText/textFileId no longer applies and removes the
+    GridFS file the old text was in.
+    """
+    fields = await store_resume_text(str(doc["_id"]), text, text_hash)
+    stale = {"textFileId": ""} if "textFileId" not in fields else {"extractedText": ""}
+    await collection.update_one({"_id": doc["_id"]}, {"$set": fields, "$unset": stale})
+    old_file_id = doc.get("textFileId")
+    if old_file_id is not None and resume_text_bucket is not None:
+        try:
+            await resume_text_bucket.delete(old_file_id)
+        except Exception as e:
+            logger.error("Error deleting replaced resume text %s from GridFS: %s", old_file_id, e)
+
+async def load_resume_text(doc: dict) -> Optional[str]:
+    """The extracted text of a resume/cv document, whether inline or in GridFS"""
+    text = doc.get("extractedText")
+    if text or doc.get("textFileId") is None or resume_text_bucket is None:
+        return text
+    try:
+        stream = await resume_text_bucket.open_download_stream(doc["textFileId"])
+        return (await stream.read()).decode("utf-8")
+    except Exception as e:
+        logger.error("Error loading resume text from GridFS: %s", e)
         return None
 
-def call_openai(prompt: str, system_message: str = None) -> str:
-    """Call OpenAI API with error handling and retry logic"""
+async def call_openai(prompt: str, system_message: str = None, max_tokens: int = 2000, json_mode: bool = False) -> str:
+    """
+    Call OpenAI API with error handling and retry logic, without blocking the event loop.
+    With json_mode the model is constrained to emit a single JSON object.
+    """
     max_retries = 3
     for attempt in range(max_retries):
         try:
-            logger.info(f"Calling OpenAI API with model {OPENAI_MODEL}")
+            logger.debug("Calling OpenAI API with model %s", OPENAI_MODEL)
             
             if not system_message:
-                system_message = "You are a helpful assistant that provides responses in valid JSON format when requested. Always ensure JSON responses are properly formatted."
+                system_message = DEFAULT_SYSTEM_MESSAGE
                 
             messages = [
                 {"role": "system", "content": system_message},
                 {"role": "user", "content": prompt}
             ]
             
-            if openai.__version__.startswith('0.'):
-                # Legacy OpenAI API
-                response = openai.ChatCompletion.create(
-                    model=OPENAI_MODEL,
-                    messages=messages,
-                    temperature=0.7,
-                    max_tokens=2000
-                )
-                return response.choices[0].message.content.strip()
-            else:
-                # Modern OpenAI API
-                response = openai_client.chat.completions.create(
-                    model=OPENAI_MODEL,
-                    messages=messages,
-                    temperature=0.7,
-                    max_tokens=2000
-                )
-                return response.choices[0].message.content.strip()
+            # JSON mode is only understood by the v1 API
+            extra_args = {"response_format": {"type": "json_object"}} if json_mode and not OPENAI_LEGACY_API else {}
+            response = await _create_chat_completion(
+                model=OPENAI_MODEL,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=max_tokens,
+                **extra_args
+            )
+            usage = getattr(response, "usage", None)
+            details = getattr(usage, "prompt_tokens_details", None)
+            if details is not None:
+                logger.info("OpenAI prompt tokens: %s, cached: %s", usage.prompt_tokens, getattr(details, 'cached_tokens', 0))
+            return response.choices[0].message.content.strip()
                 
         except Exception as e:
-            logger.error(f"OpenAI API call failed (attempt {attempt + 1}/{max_retries}): {e}")
+            logger.error("OpenAI API call failed (attempt %s/%s): %s", attempt + 1, max_retries, e)
             if attempt == max_retries - 1:
                 raise
-            import time
-            time.sleep(2 ** attempt)  # Exponential backoff
+            await asyncio.sleep(2 ** attempt)  # Exponential backoff
     
     raise Exception("Failed to get response from OpenAI after all retries")
 
-def analyze_resume_with_openai(resume_text: str, target_role: str) -> dict:
+async def stream_openai(prompt: str, system_message: str = None, max_tokens: int = 2000):
     """
-    Analyze resume using OpenAI for ATS compatibility, keywords, and recommendations
+    Yield the completion text as it is generated. Falls back to a single chunk
+    from call_openai when only the legacy (non-async) client is available.
     """
-    logger.info(f"Analyzing resume for role: {target_role}")
-    
-    system_message = """
-    You are an expert ATS (Applicant Tracking System) analyzer and resume optimizer. 
-    Your task is to analyze a resume for a specific job role and provide insights on its ATS compatibility.
-    Provide your response in valid JSON format with the following structure:
-    {
-        "ats_score": int,  // 0-100 score reflecting ATS compatibility
-        "keywords": {
-            "found": [list of keywords found in the resume relevant to the role],
-            "missing": [list of important keywords for the role that are missing]
-        },
-        "format_issues": [list of formatting issues that could impact ATS scoring],
-        "recommendations": [specific recommendations to improve the resume],
-        "sections": {
-            "contact_info": bool,
-            "summary": bool,
-            "experience": bool,
-            "education": bool,
-            "skills": bool,
-            "projects": bool,
-            "certifications": bool
-        }
-    }
+    if async_openai_client is None:
+        yield await call_openai(prompt, system_message, max_tokens=max_tokens)
+        return
+    
+    logger.info("Streaming OpenAI completion with model %s", OPENAI_MODEL)
+    stream = await async_openai_client.chat.completions.create(
+        model=OPENAI_MODEL,
+        messages=[
+            {"role": "system", "content": system_message or DEFAULT_SYSTEM_MESSAGE},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.7,
+        max_tokens=max_tokens,
+        stream=True
+    )
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+def _truncate_to_tokens(text: str, max_tokens: int) -> str:
+    if token_encoding is None:
+        # ~4 characters per token for English text
+        return text[:max_tokens * 4]
+    tokens = token_encoding.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return token_encoding.decode(tokens[:max_tokens])
+
+async def truncate_resume_text(resume_text: str, max_tokens: int = RESUME_MAX_PROMPT_TOKENS) -> str:
+    """Clip resume text to the prompt token budget"""
+    # A token is at least one character, so short texts can skip tokenizing
+    if len(resume_text) <= max_tokens:
+        return resume_text
+    truncated = await asyncio.to_thread(_truncate_to_tokens, resume_text, max_tokens)
+    if len(truncated) < len(resume_text):
+        logger.info("Truncated resume text from %s to %s characters for the prompt", len(resume_text), len(truncated))
+    return truncated
+
+async def analyze_resume_with_openai(resume_text: str, target_role: str) -> dict:
     """
+    Analyze resume using OpenAI for ATS compatibility, keywords, and recommendations
+    """
+    logger.info("Analyzing resume for role: %s", target_role)
+    resume_text = await truncate_resume_text(resume_text)
     
     prompt = f"""
-    Here is a resume text:
-    ```
-    {resume_text}
-    ```
-    
     The job role this person is applying for is: {target_role}
     
-    Analyze this resume for ATS compatibility for the specified role:
-    
-    1. Give an ATS compatibility score from 0-100
-    2. Identify keywords found in the resume that are relevant to the role
-    3. List important keywords that are missing but would be relevant for this role
-    4. Identify any formatting issues that could impact ATS scoring
-    5. Provide specific recommendations to improve the resume
-    6. Check which standard resume sections are present
-    
     Return your analysis in the JSON format described in your instructions.
+    
+    Here is the resume text:
+    ```
+    {resume_text}
+    ```
     """
     
     try:
-        response = call_openai(prompt, system_message)
+        response = await call_openai(prompt, ANALYZE_SYSTEM_MESSAGE, max_tokens=ANALYZE_MAX_TOKENS, json_mode=True)
         result = json.loads(response)
-        logger.info(f"Resume analysis completed with ATS score: {result.get('ats_score', 0)}")
+        logger.info("Resume analysis completed with ATS score: %s", result.get('ats_score', 0))
         return result
     except json.JSONDecodeError as e:
-        logger.error(f"Error parsing OpenAI response as JSON: {e}")
-        logger.debug(f"Raw response: {response}")
+        logger.error("Error parsing OpenAI response as JSON: %s", e)
+        logger.debug("Raw response: %s", response)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error parsing analysis results"
         )
     except Exception as e:
-        logger.error(f"Error analyzing resume: {e}")
+        logger.error("Error analyzing resume: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error analyzing resume: {str(e)}"
         )
 
-def suggest_roles_from_resume(resume_text: str) -> list:
+async def suggest_roles_from_resume(resume_text: str) -> list:
     """
     Suggest potential job roles based on the resume content
     """
     logger.info("Suggesting roles from resume")
-    
-    system_message = """
-    You are an expert resume analyzer and career advisor.
-    Your task is to analyze a resume and suggest potential job roles that match the candidate's skills and experience.
-    """
+    resume_text = await truncate_resume_text(resume_text)
     
     prompt = f"""
-    Here is a resume text:
+    Here is the resume text:
     ```
     {resume_text}
     ```
-    
-    Based on this person's skills, experience, and qualifications, suggest 5-8 potential job roles that would be a good match.
-    
-    Consider:
-    1. Technical skills and tools mentioned
-    2. Years of experience and seniority level
-    3. Industry background
-    4. Educational qualifications
-    
-    Return your suggestions as a JSON array of strings, each string being a job title.
-    Example: ["Software Engineer", "Full Stack Developer", "DevOps Engineer"]
-    
-    Only return the JSON array, no other text.
     """
     
     try:
-        response = call_openai(prompt, system_message)
-        
-        # Try to extract JSON array if it's wrapped in text
-        import re
-        json_match = re.search(r'\[.*\]', response, re.DOTALL)
-        if json_match:
-            response = json_match.group(0)
-            
-        result = json.loads(response)
-        logger.info(f"Suggested {len(result)} roles from resume")
+        response = await call_openai(prompt, SUGGEST_ROLES_SYSTEM_MESSAGE, max_tokens=SUGGEST_ROLES_MAX_TOKENS, json_mode=True)
+        result = json.loads(response).get("roles", [])
+        logger.info("Suggested %s roles from resume", len(result))
         return result
     except json.JSONDecodeError as e:
-        logger.error(f"Error parsing OpenAI suggested roles as JSON: {e}")
-        logger.debug(f"Raw response: {response}")
+        logger.error("Error parsing OpenAI suggested roles as JSON: %s", e)
+        logger.debug("Raw response: %s", response)
         # Return empty list rather than raising an exception
         return []
     except Exception as e:
-        logger.error(f"Error suggesting roles: {e}")
+        logger.error("Error suggesting roles: %s", e)
         return []
 
-def optimize_resume(resume_text: str, target_role: str, analysis: dict) -> str:
+async def analyze_and_suggest_with_openai(resume_text: str, target_role: str) -> tuple:
     """
-    Generate an optimized version of the resume based on analysis
+    Analyze the resume for the target role and suggest roles with a single OpenAI
+    call. Returns (analysis, suggested_roles).
     """
-    logger.info(f"Optimizing resume for role: {target_role}")
+    logger.info("Analyzing resume and suggesting roles for role: %s", target_role)
+    resume_text = await truncate_resume_text(resume_text)
     
-    system_message = """
-    You are an expert resume writer and ATS optimization specialist.
-    Your task is to rewrite and optimize a resume for a specific job role based on ATS analysis.
+    prompt = f"""
+    The job role this person is applying for is: {target_role}
+    
+    Return your analysis and role suggestions in the JSON format described in your instructions.
+    
+    Here is the resume text:
+    ```
+    {resume_text}
+    ```
     """
     
-    prompt = f"""
+    try:
+        response = await call_openai(
+            prompt,
+            ANALYZE_AND_SUGGEST_SYSTEM_MESSAGE,
+            max_tokens=ANALYZE_MAX_TOKENS + SUGGEST_ROLES_MAX_TOKENS,
+            json_mode=True
+        )
+        result = json.loads(response)
+        suggested_roles = result.pop("suggested_roles", [])
+        logger.info("Resume analysis completed with ATS score: %s, %s roles suggested",
+                    result.get('ats_score', 0), len(suggested_roles))
+        return result, suggested_roles
+    except json.JSONDecodeError as e:
+        logger.error("Error parsing OpenAI response as JSON: %s", e)
+        logger.debug("Raw response: %s", response)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error parsing analysis results"
+        )
+    except Exception as e:
+        logger.error("Error analyzing resume: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error analyzing resume: {str(e)}"
+        )
+
+def build_optimize_prompt(resume_text: str, target_role: str, analysis: dict) -> str:
+    # sort_keys keeps the serialized analysis stable for identical inputs
+    return f"""
     Here is the original resume text:
     ```
     {resume_text}
@@ -349,114 +797,337 @@ def optimize_resume(resume_text: str, target_role: str, analysis: dict) -> str:
     
     Here is the ATS analysis of the resume:
     ```
-    {json.dumps(analysis, indent=2)}
+    {json.dumps(analysis, indent=2, sort_keys=True)}
     ```
-    
-    Rewrite and optimize this resume to improve its ATS compatibility and effectiveness for the target role.
-    
-    Make sure to:
-    1. Add missing keywords identified in the analysis
-    2. Fix formatting issues
-    3. Include all standard resume sections
-    4. Maintain the person's actual experience and qualifications (don't fabricate anything)
-    5. Use clear, concise, and professional language
-    6. Organize content in a readable, ATS-friendly format
-    
-    Return the optimized resume text only, formatted professionally.
     """
+
+async def optimize_resume(resume_text: str, target_role: str, analysis: dict) -> str:
+    """
+    Generate an optimized version of the resume based on analysis
+    """
+    logger.info("Optimizing resume for role: %s", target_role)
+    
+    prompt = build_optimize_prompt(await truncate_resume_text(resume_text), target_role, analysis)
     
     try:
-        optimized_text = call_openai(prompt, system_message)
+        optimized_text = await call_openai(prompt, OPTIMIZE_SYSTEM_MESSAGE, max_tokens=OPTIMIZE_MAX_TOKENS)
         logger.info("Resume optimization completed successfully")
         return optimized_text
     except Exception as e:
-        logger.error(f"Error optimizing resume: {e}")
+        logger.error("Error optimizing resume: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error optimizing resume: {str(e)}"
         )
 
+# Only the fields the suggest-roles and duplicate-upload lookups read; keeps file metadata off the wire
+RESUME_TEXT_PROJECTION = {
+    "extractedText": 1, "textFileId": 1, "cv_text": 1, "textHash": 1,
+    "suggestedRoles": 1, "suggestedRolesTextHash": 1
+}
+
+# Everything extract_text_with_fallback may read from a resume/cv document
+RESUME_FALLBACK_PROJECTION = {
+    "extractedText": 1, "textFileId": 1, "content": 1, "text": 1, "cv_text": 1,
+    "filePath": 1, "fileId": 1, "originalName": 1, "contentHash": 1
+}
+
+# Text fields the optimize endpoint falls back through
+RESUME_OPTIMIZE_PROJECTION = {
+    "extractedText": 1, "textFileId": 1, "content": 1, "cv_text": 1, "text": 1
+}
+
+# Text length computed server side: textLen for GridFS-backed docs, else the inline text
+RESUME_TEXT_LENGTH_EXPR = {"$ifNull": ["$textLen", {"$strLenCP": {"$ifNull": ["$extractedText", ""]}}]}
+
+# Identifying fields for the debug listings; leaves resume bodies in Mongo
+RESUME_LISTING_PROJECTION = {"fileId": 1, "originalName": 1, "filename": 1}
+
+_OID_RE = re.compile(r"^[0-9a-fA-F]{24}$")
+
+def to_oid(doc_id) -> Optional[ObjectId]:
+    """ObjectId for a 24-hex-char string, otherwise None (no exception round-trip)"""
+    if isinstance(doc_id, ObjectId):
+        return doc_id
+    if isinstance(doc_id, str) and _OID_RE.match(doc_id):
+        return ObjectId(doc_id)
+    return None
+
+def id_match_clauses(doc_id: str) -> list:
+    """$or clauses matching a document ID stored either as an ObjectId or as a plain string"""
+    clauses = [{"_id": doc_id}]
+    oid = to_oid(doc_id)
+    if oid is not None:
+        clauses.insert(0, {"_id": oid})
+    return clauses
+
+async def find_resume_document(resume_id: str, user_id: str, projection: dict = None, touch: bool = False) -> tuple:
+    """
+    Look a resume up by ObjectId, string _id or fileId across the resumes and
+    cvs collections in a single aggregation. Returns (doc, collection),
+    preferring resumes, or (None, None). With touch=True the match's lastUsed is
+    queued for the batched background update.
+    """
+    clauses = id_match_clauses(resume_id) + [{"fileId": resume_id}]
+    # Each $or branch is served by the (userId, _id) or (userId, fileId) index,
+    # so a miss costs two index probes rather than a scan of the user's documents
+    query = {"userId": user_id, "$or": clauses}
+    
+    def branch(collection_name: str) -> list:
+        tag = {"_source": {"$literal": collection_name}}
+        shape = {"$project": {**projection, **tag}} if projection else {"$addFields": tag}
+        return [{"$match": query}, {"$limit": 1}, shape]
+    
+    # $unionWith appends the cvs match after the resumes one, so the final
+    # $limit keeps resumes as the preferred source
+    pipeline = branch("resumes") + [
+        {"$unionWith": {"coll": "cvs", "pipeline": branch("cvs")}},
+        {"$limit": 1},
+    ]
+    docs = await resumes_col.aggregate(pipeline).to_list(length=1)
+    if not docs:
+        return None, None
+    doc = docs[0]
+    collection = cvs_col if doc.pop("_source") == "cvs" else resumes_col
+    if touch:
+        mark_cv_used(collection, doc["_id"])
+    return doc, collection
+
+def llm_cache_key(kind: str, *parts: str) -> str:
+    """Content-addressed key for a cached LLM result"""
+    return hashlib.sha256("|".join((kind,) + parts).encode("utf-8")).hexdigest()
+
+async def get_cached_llm_result(key: str):
+    """Return a cached LLM result, or None on a miss or if the cache is unavailable"""
+    if analysis_cache_col is None:
+        return None
+    try:
+        doc = await analysis_cache_col.find_one({"_id": key}, {"result": 1})
+        return doc["result"] if doc is not None else None
+    except Exception as e:
+        logger.error("Error reading analysis cache: %s", e)
+        return None
+
+async def store_cached_llm_result(key: str, result) -> None:
+    if analysis_cache_col is None:
+        return
+    try:
+        await analysis_cache_col.replace_one(
+            {"_id": key},
+            {"_id": key, "result": result, "createdAt": datetime.utcnow()},
+            upsert=True
+        )
+    except Exception as e:
+        logger.error("Error writing analysis cache: %s", e)
+
+# LLM calls currently running, by cache key. A second request for the same key
+# that arrives before the first has finished awaits that call instead of paying
+# for its own.
+_inflight_llm_calls: Dict[str, asyncio.Task] = {}
+
+async def _compute_and_cache(key: str, compute, store_if):
+    result = await compute()
+    if store_if(result):
+        await store_cached_llm_result(key, result)
+    return result
+
+async def cached_llm_call(key: str, compute, label: str, store_if=lambda result: True):
+    """
+    Serve an LLM result from the Mongo cache, join an identical call already in
+    flight, or run compute() and cache its result when store_if(result) holds.
+    """
+    cached = await get_cached_llm_result(key)
+    if cached is not None:
+        logger.info("Using cached %s", label)
+        return cached
+    
+    task = _inflight_llm_calls.get(key)
+    if task is None:
+        task = asyncio.create_task(_compute_and_cache(key, compute, store_if))
+        _inflight_llm_calls[key] = task
+        task.add_done_callback(lambda _: _inflight_llm_calls.pop(key, None))
+    else:
+        logger.debug("Joining in-flight request for %s", label)
+    # shield: one client disconnecting must not cancel the call for the others
+    return await asyncio.shield(task)
+
+# Cache keys identify the resume by its textHash; callers that already hold the
+# digest (e.g. from the upload path or the resume doc) pass it to skip rehashing.
+async def cached_analyze_resume(resume_text: str, target_role: str, text_hash: str = None) -> dict:
+    """analyze_resume_with_openai, served from the cache when this resume/role pair was seen recently"""
+    text_hash = text_hash or await text_digest_async(resume_text)
+    key = llm_cache_key("analyze", target_role.strip().lower(), text_hash)
+    return await cached_llm_call(
+        key,
+        lambda: analyze_resume_with_openai(resume_text, target_role),
+        f"resume analysis for role: {target_role}"
+    )
+
+async def cached_suggest_roles(resume_text: str, text_hash: str = None) -> list:
+    """suggest_roles_from_resume, served from the cache when this resume was seen recently"""
+    text_hash = text_hash or await text_digest_async(resume_text)
+    key = llm_cache_key("suggest_roles", text_hash)
+    # An empty list means the call failed; don't pin that for a day
+    return await cached_llm_call(
+        key,
+        lambda: suggest_roles_from_resume(resume_text),
+        "role suggestions",
+        store_if=bool
+    )
+
+async def cached_analyze_and_suggest(resume_text: str, target_role: str, text_hash: str = None) -> tuple:
+    """
+    (analysis, suggested_roles) for an uploaded resume. Each half is served from
+    its own cache entry when present; when both are missing they come from one
+    combined call, whose halves are then cached for /analyze and /suggest-roles.
+    """
+    text_hash = text_hash or await text_digest_async(resume_text)
+    analyze_key = llm_cache_key("analyze", target_role.strip().lower(), text_hash)
+    suggest_key = llm_cache_key("suggest_roles", text_hash)
+    analysis, suggested_roles = await asyncio.gather(
+        get_cached_llm_result(analyze_key),
+        get_cached_llm_result(suggest_key)
+    )
+    if analysis is not None and suggested_roles is not None:
+        logger.info("Using cached resume analysis and role suggestions for role: %s", target_role)
+        return analysis, suggested_roles
+    if analysis is not None:
+        return analysis, await cached_suggest_roles(resume_text, text_hash)
+    if suggested_roles is not None:
+        return await cached_analyze_resume(resume_text, target_role, text_hash), suggested_roles
+    
+    async def compute():
+        analysis, suggested_roles = await analyze_and_suggest_with_openai(resume_text, target_role)
+        await store_cached_llm_result(analyze_key, analysis)
+        # An empty list means the roles part failed; don't pin that for a day
+        if suggested_roles:
+            await store_cached_llm_result(suggest_key, suggested_roles)
+        return analysis, suggested_roles
+    
+    # The halves are cached under their own keys; the combined key only dedupes in-flight calls
+    return await cached_llm_call(
+        llm_cache_key("analyze_and_suggest", target_role.strip().lower(), text_hash),
+        compute,
+        f"resume analysis and role suggestions for role: {target_role}",
+        store_if=lambda result: False
+    )
+
+def optimize_cache_key(text_hash: str, target_role: str, analysis: dict) -> str:
+    return llm_cache_key(
+        "optimize",
+        target_role.strip().lower(),
+        json.dumps(analysis, sort_keys=True, default=str),
+        text_hash
+    )
+
+async def cached_optimize_resume(resume_text: str, target_role: str, analysis: dict, text_hash: str = None) -> str:
+    """optimize_resume, served from the cache for a repeated resume/role/analysis combination"""
+    text_hash = text_hash or await text_digest_async(resume_text)
+    key = optimize_cache_key(text_hash, target_role, analysis)
+    return await cached_llm_call(
+        key,
+        lambda: optimize_resume(resume_text, target_role, analysis),
+        f"resume optimization for role: {target_role}"
+    )
+
+def optimized_pdf_filename(user_id: str, optimized_id) -> str:
+    # Keyed by the document ID, so two optimizations for the same role don't overwrite each other
+    return f"{user_id}_{optimized_id}_optimized.pdf"
+
+async def render_optimized_pdf(user_id: str, optimized_id, optimized_text: str) -> Optional[str]:
+    """Create the optimized resume PDF, returning its path or None if rendering failed"""
+    try:
+        return await create_pdf_from_text(optimized_text, optimized_pdf_filename(user_id, optimized_id))
+    except Exception as pdf_err:
+        logger.error("Error creating PDF: %s", pdf_err)
+        # Continue despite PDF error
+        return None
+
+async def save_optimized_resume(user_id: str, original_resume_id: str, target_role: str, resume_text: str,
+                                optimized_text: str, original_analysis: dict) -> tuple:
+    """
+    Rescore the optimized text and render its PDF concurrently, then store the
+    optimized resume. Returns (optimized_id, new_analysis).
+    """
+    # Allocate the ID up front so the PDF can be named after it and the
+    # document written with its filePath in a single insert
+    optimized_oid = ObjectId()
+    
+    # Neither step depends on the other: one is an LLM round trip, the other CPU work in a thread
+    new_analysis, pdf_path = await asyncio.gather(
+        cached_analyze_resume(optimized_text, target_role),
+        render_optimized_pdf(user_id, optimized_oid, optimized_text)
+    )
+    
+    optimized_doc = {
+        "_id": optimized_oid,
+        "userId": user_id,
+        "originalResumeId": original_resume_id,
+        "targetRole": target_role,
+        "originalText": resume_text,
+        "optimizedText": optimized_text,
+        "originalAnalysis": original_analysis,
+        "newAnalysis": new_analysis,
+        "createdAt": datetime.utcnow()
+    }
+    if pdf_path is not None:
+        optimized_doc["filePath"] = pdf_path
+    
+    result = await optimized_resumes_col.insert_one(optimized_doc)
+    optimized_id = str(result.inserted_id)
+    
+    logger.info("Resume optimized and saved with ID: %s", optimized_id)
+    return optimized_id, new_analysis
+
+PDF_RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", str(min(os.cpu_count() or 1, 4))))
+_pdf_pool = None
+
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    global _pdf_pool
+    if _pdf_pool is None:
+        _pdf_pool = ProcessPoolExecutor(max_workers=PDF_RENDER_WORKERS)
+    return _pdf_pool
+
+def _build_resume_pdf(text: str, output_path: str) -> None:
+    """Lay out resume text as a PDF at output_path (blocking)"""
+    doc = SimpleDocTemplate(output_path, pagesize=letter)
+    styles = getSampleStyleSheet()
+    
+    # Derive request-local styles rather than mutating the sample sheet's entries
+    custom_heading1 = ParagraphStyle('ResumeHeading1', parent=styles["Heading1"],
+                                     fontSize=14, spaceAfter=10, textColor=colors.darkblue)
+    custom_heading2 = ParagraphStyle('ResumeHeading2', parent=styles["Heading2"],
+                                     fontSize=12, spaceAfter=6, textColor=colors.black)
+    normal_style = styles["Normal"]
+    
+    # Indexed by heading level: 0 normal content, 1 subheading/short bullet, 2 section heading
+    line_styles = (normal_style, custom_heading2, custom_heading1)
+    
+    # Process text into sections
+    lines = text.split('\n')
+    elements = []
+    
+    # Simple logic to identify headings vs. content
+    for line in lines:
+        line = line.strip()
+        if not line:
+            elements.append(Spacer(1, 6))
+            continue
+        
+        length = len(line)
+        ends_with_colon = line.endswith(':')
+        level = (2 * (line.isupper() or (length < 30 and ends_with_colon))
+                 or int(ends_with_colon or (length < 40 and line.startswith('\u2022'))))
+        elements.append(Paragraph(line, line_styles[level]))
+            
+    # Build the PDF
+    doc.build(elements)
+
 async def create_pdf_from_text(text: str, filename: str) -> str:
     """
     Create a PDF file from text content
     """
-    try:
-        from reportlab.lib.pagesizes import letter
-        from reportlab.lib import colors
-        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        
-        os.makedirs("generated", exist_ok=True)
-        output_path = os.path.join("generated", filename)
-        
-        # Create PDF document
-        doc = SimpleDocTemplate(output_path, pagesize=letter)
-        styles = getSampleStyleSheet()
-        
-        # Check if styles already exist and use them instead of adding new ones
-        custom_heading1 = None
-        custom_heading2 = None
-        
-        if "Heading1" in styles:
-            # Use existing style but modify it
-            custom_heading1 = styles["Heading1"]
-            custom_heading1.fontSize = 14
-            custom_heading1.spaceAfter = 10
-            custom_heading1.textColor = colors.darkblue
-        else:
-            # Add custom styles only if they don't already exist
-            styles.add(ParagraphStyle(name='Heading1',
-                                    fontName='Helvetica-Bold',
-                                    fontSize=14,
-                                    spaceAfter=10,
-                                    textColor=colors.darkblue))
-            custom_heading1 = styles["Heading1"]
-        
-        if "Heading2" in styles:
-            # Use existing style but modify it
-            custom_heading2 = styles["Heading2"]
-            custom_heading2.fontSize = 12
-            custom_heading2.spaceAfter = 6
-            custom_heading2.textColor = colors.black
-        else:
-            # Add custom styles only if they don't already exist
-            styles.add(ParagraphStyle(name='Heading2',
-                                    fontName='Helvetica-Bold',
-                                    fontSize=12,
-                                    spaceAfter=6,
-                                    textColor=colors.black))
-            custom_heading2 = styles["Heading2"]
-        
-        normal_style = styles["Normal"]
-        
-        # Process text into sections
-        lines = text.split('\n')
-        elements = []
-        
-        # Simple logic to identify headings vs. content
-        for line in lines:
-            line = line.strip()
-            if not line:
-                elements.append(Spacer(1, 6))
-                continue
-                
-            if line.isupper() or (len(line) < 30 and line.endswith(':')):
-                # Likely a section heading
-                elements.append(Paragraph(line, custom_heading1))
-            elif line.endswith(':') or (line.startswith('•') and len(line) < 40):
-                # Likely a subheading or bullet point
-                elements.append(Paragraph(line, custom_heading2))
-            else:
-                # Normal content
-                elements.append(Paragraph(line, normal_style))
-                
-        # Build the PDF
-        doc.build(elements)
-        logger.info(f"Created optimized resume PDF at: {output_path}")
-        return output_path
-        
-    except ImportError:
-        logger.warning("ReportLab not installed, creating plain text file instead")
+    if not REPORTLAB_AVAILABLE:
         # Fallback to plain text file
         os.makedirs("generated", exist_ok=True)
         output_path = os.path.join("generated", filename.replace('.pdf', '.txt'))
@@ -464,19 +1135,31 @@ async def create_pdf_from_text(text: str, filename: str) -> str:
         with open(output_path, 'w', encoding='utf-8') as f:
             f.write(text)
             
-        logger.info(f"Created optimized resume text file at: {output_path}")
+        logger.info("Created optimized resume text file at: %s", output_path)
         return output_path
+    
+    try:
+        os.makedirs("generated", exist_ok=True)
+        output_path = os.path.join("generated", filename)
+        
+        # ReportLab layout is CPU-bound pure Python; render in a worker process
+        # so it neither blocks the event loop nor contends for this process's GIL
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(_get_pdf_pool(), _build_resume_pdf, text, output_path)
+        logger.info("Created optimized resume PDF at: %s", output_path)
+        return output_path
+        
     except Exception as e:
-        logger.error(f"Error creating PDF: {e}")
+        logger.error("Error creating PDF: %s", e)
         # Return a text file as a fallback even when PDF creation fails
         try:
             text_output_path = os.path.join("generated", filename.replace('.pdf', '.txt'))
             with open(text_output_path, 'w', encoding='utf-8') as f:
                 f.write(text)
-            logger.info(f"Created fallback text file at: {text_output_path}")
+            logger.info("Created fallback text file at: %s", text_output_path)
             return text_output_path
         except Exception as text_err:
-            logger.error(f"Error creating fallback text file: {text_err}")
+            logger.error("Error creating fallback text file: %s", text_err)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error creating PDF: {str(e)}"
@@ -485,54 +1168,11 @@ async def create_pdf_from_text(text: str, filename: str) -> str:
 # API Routes
 
 @router.post("/analyze", response_model=ResumeAnalysisResponse)
-async def analyze_resume(request: Request, analysis_req: ResumeAnalysisRequest):
+async def analyze_resume(request: Request, analysis_req: ResumeAnalysisRequest, user_id: str = Depends(require_analysis_user)):
     """
     Analyze a saved resume against ATS requirements
     """
-    logger.info(f"Analyze resume request with role: {analysis_req.target_role}")
-    
-    # Get authentication token
-    token = request.cookies.get("token")
-    if not token:
-        logger.warning("No authentication token found")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Authentication required"
-        )
-        
-    try:
-        # Verify token
-        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-        user_id = payload.get("userId")
-        if not user_id:
-            logger.warning("Invalid token: missing userId")
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication token"
-            )
-        logger.info(f"User authenticated: {user_id}")
-    except jwt.PyJWTError as e:
-        logger.error(f"JWT decode error: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=f"Invalid token: {str(e)}"
-        )
-    
-    # Check if MongoDB is available - FIX HERE
-    if resumes_col is None:
-        logger.error("MongoDB not connected")
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="Database unavailable"
-        )
-    
-    # Check if OpenAI is available
-    if openai is None or openai_api_key is None:
-        logger.error("OpenAI API not configured")
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="Analysis service unavailable"
-        )
+    logger.info("Analyze resume request with role: %s", analysis_req.target_role)
     
     # Get the resume text from database using enhanced extraction
     try:
@@ -545,109 +1185,88 @@ async def analyze_resume(request: Request, analysis_req: ResumeAnalysisRequest):
         
         # Use the enhanced text extraction method
         resume_text = await extract_text_with_fallback(resume_id, user_id)
+        remember_resume_text(user_id, resume_id, resume_text)
         
         # Analyze resume
-        analysis_result = analyze_resume_with_openai(resume_text, analysis_req.target_role)
-        logger.info(f"Analysis completed for resume: {resume_id}")
+        analysis_result = await cached_analyze_resume(resume_text, analysis_req.target_role)
+        logger.info("Analysis completed for resume: %s", resume_id)
         
         return analysis_result
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error analyzing resume: {e}")
+        logger.error("Error analyzing resume: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error analyzing resume: {str(e)}"
         )
 
 @router.post("/analyze-upload", response_model=ResumeAnalysisResponse)
-async def analyze_resume_upload(request: Request, resume_file: UploadFile = File(...), target_role: str = Form(...)):
+async def analyze_resume_upload(request: Request, resume_file: UploadFile = File(...), target_role: str = Form(...),
+                                user_id: str = Depends(require_analysis_user)):
     """
     Analyze a newly uploaded resume against ATS requirements
     """
-    logger.info(f"Analyze resume upload request for role: {target_role}")
-    
-    # Get authentication token
-    token = request.cookies.get("token")
-    if not token:
-        logger.warning("No authentication token found")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Authentication required"
-        )
-        
-    try:
-        # Verify token
-        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-        user_id = payload.get("userId")
-        if not user_id:
-            logger.warning("Invalid token: missing userId")
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication token"
-            )
-        logger.info(f"User authenticated: {user_id}")
-    except jwt.PyJWTError as e:
-        logger.error(f"JWT decode error: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=f"Invalid token: {str(e)}"
-        )
-    
-    # Check if MongoDB is available
-    if resumes_col is None:
-        logger.error("MongoDB not connected")
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="Database unavailable"
-        )
-    
-    # Check if OpenAI is available
-    if openai is None or openai_api_key is None:
-        logger.error("OpenAI API not configured")
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="Analysis service unavailable"
-        )
+    logger.info("Analyze resume upload request for role: %s", target_role)
     
     try:
         # Save file to disk
-        file_path = await save_resume_to_disk(resume_file)
-        
-        # Extract text
-        resume_text = extract_text_from_document(file_path, vision_client, openai_client)
-        
-        if not resume_text or len(resume_text.strip()) < 100:
-            logger.error("Insufficient text extracted from resume")
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Insufficient content extracted from resume"
+        file_path, file_bytes, content_hash = await save_resume_to_disk(resume_file)
+        file_size = len(file_bytes)
+        
+        # Same file uploaded before: reuse its saved text rather than extracting again
+        duplicate_doc, resume_text = await find_duplicate_upload(user_id, content_hash, file_path)
+        if duplicate_doc is not None:
+            resume_id = str(duplicate_doc["_id"])
+            text_hash = duplicate_doc.get("textHash") or await text_digest_async(resume_text)
+            stored_roles = duplicate_doc.get("suggestedRoles")
+            if stored_roles and duplicate_doc.get("suggestedRolesTextHash") == text_hash:
+                analysis_result = await cached_analyze_resume(resume_text, target_role, text_hash)
+                suggested_roles = stored_roles
+            else:
+                analysis_result, suggested_roles = await cached_analyze_and_suggest(resume_text, target_role, text_hash)
+        else:
+            # Extract text from the bytes already in memory
+            resume_text = await extract_text_from_document_async(file_path, vision_client, openai_client, file_bytes)
+            
+            if not resume_text or len(resume_text.strip()) < 100:
+                logger.error("Insufficient text extracted from resume")
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Insufficient content extracted from resume"
+                )
+            
+            # Hash once; the DB record and every cache key below reuse it
+            text_hash = await text_digest_async(resume_text)
+            
+            # Save to database while one LLM call analyzes and suggests roles;
+            # neither depends on the other, so latency is the slower of the two
+            resume_id, (analysis_result, suggested_roles) = await asyncio.gather(
+                save_resume_to_db(
+                    user_id=user_id,
+                    file_path=file_path,
+                    filename=resume_file.filename,
+                    file_size=file_size,
+                    content_type=resume_file.content_type or "application/octet-stream",
+                    extracted_text=resume_text,
+                    text_hash=text_hash,
+                    content_hash=content_hash
+                ),
+                cached_analyze_and_suggest(resume_text, target_role, text_hash)
             )
         
-        # Save to database
-        resume_id = await save_resume_to_db(
-            user_id=user_id,
-            file_path=file_path,
-            filename=resume_file.filename,
-            file_size=os.path.getsize(file_path),
-            content_type=resume_file.content_type or "application/octet-stream",
-            extracted_text=resume_text
-        )
-        
-        # Analyze resume
-        analysis_result = analyze_resume_with_openai(resume_text, target_role)
-        
-        # Add resume_id to the result
-        analysis_result["resume_id"] = resume_id
+        # Add resume_id and suggestions to the result (copy; it may be shared with the cache)
+        analysis_result = {**analysis_result, "resume_id": resume_id, "suggested_roles": suggested_roles}
+        remember_resume_text(user_id, resume_id, resume_text)
         
-        logger.info(f"Analysis completed for uploaded resume, saved as: {resume_id}")
+        logger.info("Analysis completed for uploaded resume, saved as: %s", resume_id)
         return analysis_result
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error analyzing uploaded resume: {e}")
+        logger.error("Error analyzing uploaded resume: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error analyzing resume: {str(e)}"
@@ -661,7 +1280,8 @@ class SuggestRolesRequest(BaseModel):
 async def suggest_roles(
     request: Request, 
     req_data: Optional[SuggestRolesRequest] = None,
-    resume_id: Optional[str] = Form(None)
+    resume_id: Optional[str] = Form(None),
+    user_id: str = Depends(require_analysis_user)
 ):
     """
     Suggest potential job roles based on resume content
@@ -677,7 +1297,7 @@ async def suggest_roles(
         try:
             body = await request.json()
             resume_id = body.get("resume_id")
-        except:
+        except Exception:
             pass
     
     # Check if we have a resume_id
@@ -688,129 +1308,59 @@ async def suggest_roles(
             detail="Resume ID is required"
         )
     
-    logger.info(f"Suggest roles request for resume: {resume_id}")
-    
-    # Get authentication token
-    token = request.cookies.get("token")
-    if not token:
-        logger.warning("No authentication token found")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Authentication required"
-        )
-        
-    try:
-        # Verify token
-        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-        user_id = payload.get("userId")
-        if not user_id:
-            logger.warning("Invalid token: missing userId")
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication token"
-            )
-        logger.info(f"User authenticated: {user_id}")
-    except jwt.PyJWTError as e:
-        logger.error(f"JWT decode error: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=f"Invalid token: {str(e)}"
-        )
-    
-    # Check if MongoDB is available
-    if resumes_col is None:
-        logger.error("MongoDB not connected")
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="Database unavailable"
-        )
-    
-    # Check if OpenAI is available
-    if openai is None or openai_api_key is None:
-        logger.error("OpenAI API not configured")
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="Analysis service unavailable"
-        )
+    logger.info("Suggest roles request for resume: %s", resume_id)
     
     resume_text = None
     try:
-        # First, try to find the resume in the resumes collection
-        try:
-            object_id = ObjectId(resume_id)
-            resume_doc = await resumes_col.find_one({
-                "_id": object_id,
-                "userId": user_id
-            })
-        except:
-            # Try as string if ObjectId conversion fails
-            try:
-                resume_doc = await resumes_col.find_one({
-                    "_id": resume_id,
-                    "userId": user_id
-                })
-            except:
-                resume_doc = None
-                
-        # If found, extract text
-        if resume_doc is not None:
-            logger.info(f"Found resume in resumes collection: {resume_id}")
-            resume_text = resume_doc.get("extractedText")
+        # Look in the resumes and cvs collections in one query (resumes preferred)
+        source_doc, source_col = await find_resume_document(resume_id, user_id, RESUME_TEXT_PROJECTION)
+        if source_doc is not None:
+            logger.debug("Found resume in %s collection: %s", source_col.name, resume_id)
         else:
-            # If not found in resumes collection, try cvs collection
-            logger.info(f"Resume not found in resumes collection, trying cvs collection")
-            
-            try:
-                db = resumes_col.database
-                cvs_col = db.get_collection("cvs")
-                
-                if cvs_col is not None:
-                    # Try with ObjectId
-                    try:
-                        object_id = ObjectId(resume_id)
-                        cv_doc = await cvs_col.find_one({
-                            "_id": object_id,
-                            "userId": user_id
-                        })
-                    except:
-                        # Try as string
-                        try:
-                            cv_doc = await cvs_col.find_one({
-                                "_id": resume_id,
-                                "userId": user_id
-                            })
-                        except:
-                            cv_doc = None
-                    
-                    # Also try with fileId
-                    if cv_doc is None:
-                        cv_doc = await cvs_col.find_one({
-                            "fileId": resume_id,
-                            "userId": user_id
-                        })
-                        
-                    if cv_doc is not None:
-                        logger.info(f"Found resume in cvs collection: {resume_id}")
-                        # Try different field names
-                        resume_text = cv_doc.get("extractedText") or cv_doc.get("cv_text")
-                    else:
-                        logger.warning(f"Resume not found in cvs collection either: {resume_id}")
-                else:
-                    logger.warning("cvs collection not available")
-            except Exception as e:
-                logger.error(f"Error checking cvs collection: {e}")
+            logger.warning("Resume not found in resumes or cvs collection: %s", resume_id)
+        
+        # Roles stored on the document are valid while its text is unchanged; with a
+        # stored textHash this answers without even loading the text
+        if (source_doc is not None and source_doc.get("suggestedRoles")
+                and source_doc.get("textHash")
+                and source_doc.get("suggestedRolesTextHash") == source_doc["textHash"]):
+            logger.info("Using stored role suggestions for resume: %s", resume_id)
+            return {"suggested_roles": source_doc["suggestedRoles"], "resume_id": resume_id}
+        
+        if source_doc is not None:
+            # Try different field names
+            resume_text = await load_resume_text(source_doc) or source_doc.get("cv_text")
         
         # If still no text, raise 404
         if resume_text is None or len(resume_text.strip()) < 100:
-            logger.warning(f"No valid text found for resume: {resume_id}")
+            logger.warning("No valid text found for resume: %s", resume_id)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Resume not found or text extraction failed"
             )
         
+        text_hash = source_doc.get("textHash") or await text_digest_async(resume_text)
+        if source_doc.get("suggestedRoles") and source_doc.get("suggestedRolesTextHash") == text_hash:
+            logger.info("Using stored role suggestions for resume: %s", resume_id)
+            return {"suggested_roles": source_doc["suggestedRoles"], "resume_id": resume_id}
+        
         # Suggest roles
-        suggested_roles = suggest_roles_from_resume(resume_text)
-        logger.info(f"Suggested {len(suggested_roles)} roles for resume: {resume_id}")
+        suggested_roles = await cached_suggest_roles(resume_text, text_hash)
+        logger.info("Suggested %s roles for resume: %s", len(suggested_roles), resume_id)
+        
+        # Remember them on the document for the next page load
+        if suggested_roles:
+            try:
+                await source_col.update_one(
+                    {"_id": source_doc["_id"]},
+                    {"$set": {
+                        "suggestedRoles": suggested_roles,
+                        "suggestedRolesAt": datetime.utcnow(),
+                        "suggestedRolesTextHash": text_hash
+                    }}
+                )
+            except Exception as e:
+                logger.error("Error storing suggested roles on resume: %s", e)
         
         return {
             "suggested_roles": suggested_roles,
@@ -820,186 +1370,98 @@ async def suggest_roles(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error suggesting roles: {e}")
+        logger.error("Error suggesting roles: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error suggesting roles: {str(e)}"
         )
-
-@router.post("/optimize", response_model=dict)
-async def optimize_resume_endpoint(request: Request, optimize_req: OptimizeResumeRequest):
-    """
-    Generate an optimized version of the resume based on analysis
-    """
-    logger.info(f"Optimize resume request for resume: {optimize_req.resume_id}")
-    
-    # Get authentication token
-    token = request.cookies.get("token")
-    if not token:
-        logger.warning("No authentication token found")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Authentication required"
-        )
-        
-    try:
-        # Verify token
-        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-        user_id = payload.get("userId")
-        if not user_id:
-            logger.warning("Invalid token: missing userId")
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication token"
-            )
-        logger.info(f"User authenticated: {user_id}")
-    except jwt.PyJWTError as e:
-        logger.error(f"JWT decode error: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=f"Invalid token: {str(e)}"
-        )
-    
-    # Check if MongoDB is available - FIX: Changed from boolean check to None comparison
-    if resumes_col is None or optimized_resumes_col is None:
-        logger.error("MongoDB not connected")
+
+async def load_resume_text_for_optimize(resume_id: str, user_id: str) -> tuple:
+    """
+    Read a resume's text from Mongo for the optimize endpoint, walking the
+    alternative text fields. Returns (text, resume document ID as a string).
+    """
+    # Get the resume from database (resumes or cvs, by any ID form)
+    # One round trip over both collections; lastUsed is bumped in the background
+    resume_doc, _ = await find_resume_document(
+        resume_id, user_id, RESUME_OPTIMIZE_PROJECTION, touch=True
+    )
+            
+    if resume_doc is None:
+        logger.warning("Resume not found: %s", resume_id)
         raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="Database unavailable"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Resume not found"
         )
+        
+    # Extract text - FIX: Changed from using get directly to proper None check
+    resume_text = await load_resume_text(resume_doc)
+    if resume_text is None or len(resume_text.strip()) < 100:
+        # Try alternative fields
+        resume_text = resume_doc.get("content")
+        if resume_text is None or len(resume_text.strip()) < 100:
+            resume_text = resume_doc.get("cv_text")
+            if resume_text is None or len(resume_text.strip()) < 100:
+                resume_text = resume_doc.get("text")
     
-    # Check if OpenAI is available
-    if openai is None or openai_api_key is None:
-        logger.error("OpenAI API not configured")
+    if resume_text is None or len(resume_text.strip()) < 100:
+        logger.error("Insufficient text in resume: %s", resume_id)
         raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="Optimization service unavailable"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Insufficient content in resume"
         )
-    
-    try:
-        # Get the resume from database
-        try:
-            object_id = ObjectId(optimize_req.resume_id)
-            resume_doc = await resumes_col.find_one({
-                "_id": object_id,
-                "userId": user_id
-            })
-        except:
-            # Try as string if ObjectId conversion fails
-            resume_doc = await resumes_col.find_one({
-                "_id": optimize_req.resume_id,
-                "userId": user_id
-            })
-            
-        if resume_doc is None:
-            # Also try in cvs collection
-            try:
-                db = resumes_col.database
-                cvs_col = db.get_collection("cvs")
-                
-                if cvs_col is not None:
-                    # Try with ObjectId
-                    try:
-                        object_id = ObjectId(optimize_req.resume_id)
-                        resume_doc = await cvs_col.find_one({
-                            "_id": object_id,
-                            "userId": user_id
-                        })
-                    except:
-                        # Try as string
-                        resume_doc = await cvs_col.find_one({
-                            "_id": optimize_req.resume_id,
-                            "userId": user_id
-                        })
-                        
-                    # Also try with fileId
-                    if resume_doc is None:
-                        resume_doc = await cvs_col.find_one({
-                            "fileId": optimize_req.resume_id,
-                            "userId": user_id
-                        })
-            except Exception as e:
-                logger.error(f"Error checking cvs collection: {e}")
-                
+    return resume_text, str(resume_doc["_id"])
+
+async def resume_text_for_optimize(optimize_req: OptimizeResumeRequest, user_id: str) -> tuple:
+    """
+    The text to optimize and the ID of the resume it belongs to, without reading
+    the resume's text from Mongo. Text sent with the request is only used once
+    the resume is confirmed to be the user's; otherwise the per-user memo from
+    the analyze call supplies it. Returns (None, resume_id) when neither does.
+    """
+    client_text = optimize_req.resume_text
+    if client_text is not None and len(client_text.strip()) >= 100:
+        resume_doc, _ = await find_resume_document(optimize_req.resume_id, user_id, {"_id": 1}, touch=True)
         if resume_doc is None:
-            logger.warning(f"Resume not found: {optimize_req.resume_id}")
+            logger.warning("Resume not found: %s", optimize_req.resume_id)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Resume not found"
             )
-            
-        # Extract text - FIX: Changed from using get directly to proper None check
-        resume_text = resume_doc.get("extractedText")
-        if resume_text is None or len(resume_text.strip()) < 100:
-            # Try alternative fields
-            resume_text = resume_doc.get("content")
-            if resume_text is None or len(resume_text.strip()) < 100:
-                resume_text = resume_doc.get("cv_text")
-                if resume_text is None or len(resume_text.strip()) < 100:
-                    resume_text = resume_doc.get("text")
-        
-        if resume_text is None or len(resume_text.strip()) < 100:
-            logger.error(f"Insufficient text in resume: {optimize_req.resume_id}")
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Insufficient content in resume"
-            )
-        
-        # Update last used timestamp
-        collection_for_update = None
-        if "resumes" in resume_doc:
-            collection_for_update = resumes_col
-        else:
-            # Use cvs collection
-            db = resumes_col.database
-            collection_for_update = db.get_collection("cvs")
-            
-        if collection_for_update is not None:
-            await collection_for_update.update_one(
-                {"_id": resume_doc["_id"]},
-                {"$set": {"lastUsed": datetime.utcnow()}}
-            )
+        return client_text, str(resume_doc["_id"])
+    
+    return recall_resume_text(user_id, optimize_req.resume_id), optimize_req.resume_id
+
+@router.post("/optimize", response_class=FAST_JSON_RESPONSE)
+async def optimize_resume_endpoint(request: Request, optimize_req: OptimizeResumeRequest, user_id: str = Depends(require_optimization_user)):
+    """
+    Generate an optimized version of the resume based on analysis
+    """
+    logger.info("Optimize resume request for resume: %s", optimize_req.resume_id)
+    
+    try:
+        # Common flow: the text came with the request or from the analyze call
+        # just before this one, so the resume's text isn't read from Mongo again
+        resume_text, original_resume_id = await resume_text_for_optimize(optimize_req, user_id)
+        if resume_text is None:
+            resume_text, original_resume_id = await load_resume_text_for_optimize(optimize_req.resume_id, user_id)
         
         # Optimize resume
-        optimized_text = optimize_resume(
+        optimized_text = await cached_optimize_resume(
             resume_text=resume_text,
             target_role=optimize_req.target_role,
             analysis=optimize_req.analysis
         )
         
-        # Calculate new ATS score
-        new_analysis = analyze_resume_with_openai(optimized_text, optimize_req.target_role)
-        
-        # Save optimized resume to database
-        optimized_doc = {
-            "userId": user_id,
-            "originalResumeId": str(resume_doc["_id"]),
-            "targetRole": optimize_req.target_role,
-            "originalText": resume_text,
-            "optimizedText": optimized_text,
-            "originalAnalysis": optimize_req.analysis,
-            "newAnalysis": new_analysis,
-            "createdAt": datetime.utcnow()
-        }
-        
-        result = await optimized_resumes_col.insert_one(optimized_doc)
-        optimized_id = str(result.inserted_id)
-        
-        logger.info(f"Resume optimized and saved with ID: {optimized_id}")
-        
-        # Create optimized PDF
-        try:
-            filename = f"{user_id}_{optimize_req.target_role.replace(' ', '_')}_optimized.pdf"
-            pdf_path = await create_pdf_from_text(optimized_text, filename)
-            
-            # Update document with file path
-            await optimized_resumes_col.update_one(
-                {"_id": result.inserted_id},
-                {"$set": {"filePath": pdf_path}}
-            )
-        except Exception as pdf_err:
-            logger.error(f"Error creating PDF: {pdf_err}")
-            # Continue despite PDF error
+        # Calculate new ATS score, render the PDF and save to database
+        optimized_id, new_analysis = await save_optimized_resume(
+            user_id=user_id,
+            original_resume_id=original_resume_id,
+            target_role=optimize_req.target_role,
+            resume_text=resume_text,
+            optimized_text=optimized_text,
+            original_analysis=optimize_req.analysis
+        )
         
         # Get improvement
         original_score = optimize_req.analysis.get("ats_score", 0)
@@ -1014,45 +1476,110 @@ async def optimize_resume_endpoint(request: Request, optimize_req: OptimizeResum
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error optimizing resume: {e}")
+        logger.error("Error optimizing resume: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error optimizing resume: {str(e)}"
         )
 
-@router.post("/download-optimized")
-async def download_optimized_resume(request: Request, data: dict):
+@router.post("/optimize-stream")
+async def optimize_resume_stream(request: Request, optimize_req: OptimizeResumeRequest, user_id: str = Depends(require_optimization_user)):
     """
-    Download an optimized resume as PDF
+    Stream the optimized resume text as it is generated, so the client can render
+    it progressively. The finished text is cached, so a following /optimize call
+    for the same resume, role and analysis returns without another LLM call.
+    """
+    logger.info("Streaming optimize request for resume: %s", optimize_req.resume_id)
+    
+    resume_text, _ = await resume_text_for_optimize(optimize_req, user_id)
+    if resume_text is None:
+        resume_text = await extract_text_with_fallback(optimize_req.resume_id, user_id)
+    key = optimize_cache_key(await text_digest_async(resume_text), optimize_req.target_role, optimize_req.analysis)
+    cached = await get_cached_llm_result(key)
+    
+    async def generate():
+        if cached is not None:
+            logger.info("Using cached resume optimization for role: %s", optimize_req.target_role)
+            yield cached
+            return
+        
+        parts = []
+        prompt = build_optimize_prompt(await truncate_resume_text(resume_text), optimize_req.target_role, optimize_req.analysis)
+        async for delta in stream_openai(prompt, OPTIMIZE_SYSTEM_MESSAGE, max_tokens=OPTIMIZE_MAX_TOKENS):
+            parts.append(delta)
+            yield delta
+        
+        optimized_text = "".join(parts).strip()
+        if optimized_text:
+            await store_cached_llm_result(key, optimized_text)
+    
+    return StreamingResponse(generate(), media_type="text/plain; charset=utf-8")
+
+@router.post("/analyze-and-optimize", response_class=FAST_JSON_RESPONSE)
+async def analyze_and_optimize_resume(request: Request, analysis_req: ResumeAnalysisRequest, user_id: str = Depends(require_optimization_user)):
     """
-    logger.info(f"Download optimized resume request for: {data.get('optimized_id')}")
+    Analyze a saved resume, suggest roles and generate an optimized version in one request
+    """
+    logger.info("Analyze and optimize request for resume: %s", analysis_req.resume_id)
     
-    # Get authentication token
-    token = request.cookies.get("token")
-    if not token:
-        logger.warning("No authentication token found")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Authentication required"
-        )
-        
     try:
-        # Verify token
-        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-        user_id = payload.get("userId")
-        if not user_id:
-            logger.warning("Invalid token: missing userId")
+        resume_id = analysis_req.resume_id
+        if not resume_id:
             raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication token"
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Resume ID is required"
             )
-        logger.info(f"User authenticated: {user_id}")
-    except jwt.PyJWTError as e:
-        logger.error(f"JWT decode error: {e}")
+        
+        resume_text = await extract_text_with_fallback(resume_id, user_id)
+        target_role = analysis_req.target_role
+        
+        text_hash = await text_digest_async(resume_text)
+        
+        # Analysis and role suggestions are independent, so run them together
+        analysis, suggested_roles = await asyncio.gather(
+            cached_analyze_resume(resume_text, target_role, text_hash),
+            cached_suggest_roles(resume_text, text_hash)
+        )
+        
+        # Optimization needs the analysis; rescoring (with the PDF alongside) needs the optimized text
+        optimized_text = await cached_optimize_resume(resume_text, target_role, analysis, text_hash)
+        
+        optimized_id, new_analysis = await save_optimized_resume(
+            user_id=user_id,
+            original_resume_id=resume_id,
+            target_role=target_role,
+            resume_text=resume_text,
+            optimized_text=optimized_text,
+            original_analysis=analysis
+        )
+        
+        original_score = analysis.get("ats_score", 0)
+        new_score = new_analysis.get("ats_score", 0)
+        
+        return {
+            "resume_id": resume_id,
+            "analysis": analysis,
+            "suggested_roles": suggested_roles,
+            "id": optimized_id,
+            "ats_score": new_score,
+            "improvement": new_score - original_score
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error analyzing and optimizing resume: %s", e)
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=f"Invalid token: {str(e)}"
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error analyzing and optimizing resume: {str(e)}"
         )
+
+@router.post("/download-optimized")
+async def download_optimized_resume(request: Request, data: dict, user_id: str = Depends(get_current_user_id)):
+    """
+    Download an optimized resume as PDF
+    """
+    logger.info("Download optimized resume request for: %s", data.get('optimized_id'))
     
     # Check if MongoDB is available
     if optimized_resumes_col is None:
@@ -1071,21 +1598,13 @@ async def download_optimized_resume(request: Request, data: dict):
                 detail="Optimized resume ID is required"
             )
             
-        try:
-            object_id = ObjectId(optimized_id)
-            optimized_doc = await optimized_resumes_col.find_one({
-                "_id": object_id,
-                "userId": user_id
-            })
-        except:
-            # Try as string if ObjectId conversion fails
-            optimized_doc = await optimized_resumes_col.find_one({
-                "_id": optimized_id,
-                "userId": user_id
-            })
+        optimized_doc = await optimized_resumes_col.find_one({
+            "userId": user_id,
+            "$or": id_match_clauses(optimized_id)
+        })
             
         if optimized_doc is None:
-            logger.warning(f"Optimized resume not found: {optimized_id}")
+            logger.warning("Optimized resume not found: %s", optimized_id)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Optimized resume not found"
@@ -1093,7 +1612,8 @@ async def download_optimized_resume(request: Request, data: dict):
         
         # Check if we have a saved file path
         file_path = optimized_doc.get("filePath")
-        if file_path is not None and os.path.exists(file_path):
+        stat_result = await stat_regular_file(file_path)
+        if stat_result is not None:
             # Check if it's a PDF or TXT file
             media_type = "application/pdf"
             if file_path.endswith(".txt"):
@@ -1102,79 +1622,87 @@ async def download_optimized_resume(request: Request, data: dict):
             # Generate file on-the-fly
             optimized_text = optimized_doc.get("optimizedText")
             if optimized_text is None or len(optimized_text.strip()) < 100:
-                logger.error(f"No optimized text found for: {optimized_id}")
+                logger.error("No optimized text found for: %s", optimized_id)
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Optimized resume content not found"
                 )
                 
-            target_role = optimized_doc.get("targetRole", "Position")
-            filename = f"{user_id}_{target_role.replace(' ', '_').replace('/', '_')}_optimized.pdf"
+            filename = optimized_pdf_filename(user_id, optimized_doc["_id"])
             
             try:
                 # Try to create PDF first
                 file_path = await create_pdf_from_text(optimized_text, filename)
                 media_type = "application/pdf" if file_path.endswith(".pdf") else "text/plain"
-                
-                # Update document with file path
-                await optimized_resumes_col.update_one(
-                    {"_id": optimized_doc["_id"]},
-                    {"$set": {"filePath": file_path}}
-                )
             except Exception as pdf_err:
                 # If PDF creation fails, fall back to plain text
-                logger.error(f"Error creating PDF, using text fallback: {pdf_err}")
+                logger.error("Error creating PDF, using text fallback: %s", pdf_err)
                 text_filename = filename.replace('.pdf', '.txt')
                 text_path = os.path.join("generated", text_filename)
                 
                 try:
-                    with open(text_path, 'w', encoding='utf-8') as f:
-                        f.write(optimized_text)
+                    async with aiofiles.open(text_path, 'w', encoding='utf-8') as f:
+                        await f.write(optimized_text)
                     
                     file_path = text_path
                     media_type = "text/plain"
-                    
-                    # Update document with file path
-                    await optimized_resumes_col.update_one(
-                        {"_id": optimized_doc["_id"]},
-                        {"$set": {"filePath": file_path}}
-                    )
                 except Exception as text_err:
-                    logger.error(f"Error creating text file: {text_err}")
+                    logger.error("Error creating text file: %s", text_err)
                     raise HTTPException(
                         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                         detail=f"Error creating downloadable file: {str(text_err)}"
                     )
+            
+            # Remember whichever file was produced, in one write
+            await optimized_resumes_col.update_one(
+                {"_id": optimized_doc["_id"]},
+                {"$set": {"filePath": file_path}}
+            )
         
         # Return the file
         filename = os.path.basename(file_path)
         # Add Content-Disposition header to force download with proper filename
         headers = {"Content-Disposition": f"attachment; filename={filename}"}
+        # Hand FileResponse the stat we already have so it doesn't take another
+        if stat_result is None:
+            stat_result = await aiofiles.os.stat(file_path)
         
         return FileResponse(
             path=file_path,
             filename=filename,
             media_type=media_type,
-            headers=headers
+            headers=headers,
+            stat_result=stat_result
         )
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error downloading optimized resume: {e}")
+        logger.error("Error downloading optimized resume: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error downloading optimized resume: {str(e)}"
         )
 
-@router.get("/health")
+# Monitors poll /health many times a second; the ISO timestamp only needs
+# second resolution, so it is rebuilt at most once per second
+_health_timestamp = ("", 0.0)
+
+def health_timestamp() -> str:
+    global _health_timestamp
+    now = time.time()
+    if now - _health_timestamp[1] >= 1:
+        _health_timestamp = (datetime.utcnow().isoformat(), now)
+    return _health_timestamp[0]
+
+@router.get("/health", response_class=FAST_JSON_RESPONSE)
 async def health_check():
     """
     Health check endpoint for monitoring
     """
     health_status = {
         "status": "healthy",
-        "timestamp": datetime.utcnow().isoformat(),
+        "timestamp": health_timestamp(),
         "services": {
             "mongodb": "connected" if resumes_col is not None else "disconnected",
             "vision_api": "available" if vision_client is not None else "unavailable",
@@ -1188,62 +1716,31 @@ async def health_check():
         
     return health_status
 
-@router.post("/suggest-roles-upload", response_model=SuggestedRolesResponse)
-async def suggest_roles_upload(request: Request, resume_file: UploadFile = File(...)):
+@router.post("/suggest-roles-upload", response_model=SuggestedRolesResponse, response_class=FAST_JSON_RESPONSE)
+async def suggest_roles_upload(request: Request, resume_file: UploadFile = File(...), user_id: str = Depends(require_analysis_user)):
     """
     Suggest potential job roles based on a newly uploaded resume
     """
-    logger.info(f"Suggest roles from uploaded resume: {resume_file.filename}")
-    
-    # Get authentication token
-    token = request.cookies.get("token")
-    if not token:
-        logger.warning("No authentication token found")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Authentication required"
-        )
-        
-    try:
-        # Verify token
-        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-        user_id = payload.get("userId")
-        if not user_id:
-            logger.warning("Invalid token: missing userId")
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication token"
-            )
-        logger.info(f"User authenticated: {user_id}")
-    except jwt.PyJWTError as e:
-        logger.error(f"JWT decode error: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=f"Invalid token: {str(e)}"
-        )
-    
-    # Check if MongoDB is available
-    if resumes_col is None:
-        logger.error("MongoDB not connected")
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="Database unavailable"
-        )
-    
-    # Check if OpenAI is available
-    if openai is None or openai_api_key is None:
-        logger.error("OpenAI API not configured")
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="Analysis service unavailable"
-        )
+    logger.info("Suggest roles from uploaded resume: %s", resume_file.filename)
     
     try:
         # Save file to disk
-        file_path = await save_resume_to_disk(resume_file)
-        
-        # Extract text
-        resume_text = extract_text_from_document(file_path, vision_client, openai_client)
+        file_path, file_bytes, content_hash = await save_resume_to_disk(resume_file)
+        file_size = len(file_bytes)
+        
+        # Same file uploaded before: skip extraction and reuse its saved text and roles
+        duplicate_doc, resume_text = await find_duplicate_upload(user_id, content_hash, file_path)
+        if duplicate_doc is not None:
+            resume_id = str(duplicate_doc["_id"])
+            text_hash = duplicate_doc.get("textHash") or await text_digest_async(resume_text)
+            suggested_roles = await roles_for_saved_resume(duplicate_doc, resume_text, text_hash)
+            return {
+                "suggested_roles": suggested_roles,
+                "resume_id": resume_id
+            }
+        
+        # Extract text from the bytes already in memory
+        resume_text = await extract_text_from_document_async(file_path, vision_client, openai_client, file_bytes)
         
         if not resume_text or len(resume_text.strip()) < 100:
             logger.error("Insufficient text extracted from resume")
@@ -1252,19 +1749,23 @@ async def suggest_roles_upload(request: Request, resume_file: UploadFile = File(
                 detail="Insufficient content extracted from resume"
             )
         
+        text_hash = await text_digest_async(resume_text)
+        
         # Save to database
         resume_id = await save_resume_to_db(
             user_id=user_id,
             file_path=file_path,
             filename=resume_file.filename,
-            file_size=os.path.getsize(file_path),
+            file_size=file_size,
             content_type=resume_file.content_type or "application/octet-stream",
-            extracted_text=resume_text
+            extracted_text=resume_text,
+            text_hash=text_hash,
+            content_hash=content_hash
         )
         
         # Suggest roles
-        suggested_roles = suggest_roles_from_resume(resume_text)
-        logger.info(f"Suggested {len(suggested_roles)} roles for uploaded resume, saved as: {resume_id}")
+        suggested_roles = await cached_suggest_roles(resume_text, text_hash)
+        logger.info("Suggested %s roles for uploaded resume, saved as: %s", len(suggested_roles), resume_id)
         
         return {
             "suggested_roles": suggested_roles,
@@ -1274,7 +1775,7 @@ async def suggest_roles_upload(request: Request, resume_file: UploadFile = File(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error suggesting roles from uploaded resume: {e}")
+        logger.error("Error suggesting roles from uploaded resume: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error suggesting roles: {str(e)}"
@@ -1282,40 +1783,13 @@ async def suggest_roles_upload(request: Request, resume_file: UploadFile = File(
         
 
 
-@router.get("/saved-resumes")
-async def get_saved_resumes(request: Request):
+@router.get("/saved-resumes", response_class=FAST_JSON_RESPONSE)
+async def get_saved_resumes(request: Request, user_id: str = Depends(get_current_user_id)):
     """
     Get all saved resumes for the authenticated user
     """
     logger.info("Get saved resumes request")
     
-    # Get authentication token
-    token = request.cookies.get("token")
-    if not token:
-        logger.warning("No authentication token found")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Authentication required"
-        )
-        
-    try:
-        # Verify token
-        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-        user_id = payload.get("userId")
-        if not user_id:
-            logger.warning("Invalid token: missing userId")
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication token"
-            )
-        logger.info(f"User authenticated: {user_id}")
-    except jwt.PyJWTError as e:
-        logger.error(f"JWT decode error: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=f"Invalid token: {str(e)}"
-        )
-    
     # Check if MongoDB is available
     if resumes_col is None:
         logger.error("MongoDB not connected")
@@ -1325,8 +1799,11 @@ async def get_saved_resumes(request: Request):
         )
     
     try:
-        # Find all resumes for this user
-        cursor = resumes_col.find({"userId": user_id})
+        # Newest first, served by the (userId, uploadedAt) index; only the listed fields
+        cursor = resumes_col.find(
+            {"userId": user_id},
+            {"originalName": 1, "uploadedAt": 1, "fileSize": 1, "userId": 1}
+        ).sort("uploadedAt", -1).limit(100)
         resumes = await cursor.to_list(length=100)
         
         # Convert ObjectId to string for JSON serialization and format for frontend
@@ -1341,21 +1818,43 @@ async def get_saved_resumes(request: Request):
                 "userId": resume.get("userId", "")
             })
             
-        logger.info(f"Found {len(formatted_resumes)} resumes for user: {user_id}")
+        logger.info("Found %s resumes for user: %s", len(formatted_resumes), user_id)
         return {"resumes": formatted_resumes}
         
     except Exception as e:
-        logger.error(f"Error retrieving resumes: {e}")
+        logger.error("Error retrieving resumes: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error retrieving resumes: {str(e)}"
         )
         
+async def text_from_same_content(resume_doc: dict, source_col, user_id: str) -> Optional[str]:
+    """
+    Text saved on another of the user's documents with the same contentHash,
+    copied onto resume_doc so later reads find it directly. None on a miss.
+    """
+    try:
+        twin = await source_col.find_one(
+            {"userId": user_id, "contentHash": resume_doc["contentHash"], "_id": {"$ne": resume_doc["_id"]}},
+            RESUME_TEXT_PROJECTION
+        )
+        if twin is None:
+            return None
+        text = await load_resume_text(twin)
+        if not text or len(text.strip()) < 100:
+            return None
+        await replace_resume_text(source_col, resume_doc, text, twin.get("textHash"))
+        logger.info("Reused text from identical upload %s", twin["_id"])
+        return text
+    except Exception as e:
+        logger.error("Error looking up text by content hash: %s", e)
+        return None
+
 async def extract_text_with_fallback(cv_id: str, user_id: str) -> str:
     """
     Retrieve resume text using multiple methods to ensure we get content
     """
-    logger.info(f"Extracting text with fallback for CV: {cv_id}")
+    logger.info("Extracting text with fallback for CV: %s", cv_id)
     
     if not cv_id or not user_id or resumes_col is None:
         logger.error("Missing required parameters or database connection")
@@ -1364,258 +1863,103 @@ async def extract_text_with_fallback(cv_id: str, user_id: str) -> str:
             detail="Unable to extract resume text"
         )
     
+    # Text this worker already resolved for the resume (analyze -> optimize, retries)
+    cached_text = recall_resume_text(user_id, cv_id)
+    if cached_text is not None:
+        return cached_text
+    
     try:
-        # Get database reference
-        db = resumes_col.database
-        
-        # Try primary resumes collection first
-        resume_doc = None
-        
-        # Improved resume document search
-        search_queries = [
-            # Try with exact string ID
-            {"_id": cv_id, "userId": user_id},
-            
-            # Try with ObjectId if possible
-            None,  # Will be set below if ObjectId conversion succeeds
-            
-            # Try with fileId
-            {"fileId": cv_id, "userId": user_id},
-            
-            # Try with just userId, check _id manually later
-            {"userId": user_id}
-        ]
-        
-        # Set the ObjectId query if possible
-        try:
-            object_id = ObjectId(cv_id)
-            search_queries[1] = {"_id": object_id, "userId": user_id}
-        except:
-            logger.warning(f"Could not convert {cv_id} to ObjectId")
-        
-        # Try each query until we find a matching document
-        for query in search_queries:
-            if query is None:
-                continue
-                
-            logger.info(f"Trying query: {query}")
-            
-            # For the last query, we need to search differently
-            if len(query) == 1 and "userId" in query:
-                # Get all documents for this user
-                cursor = resumes_col.find(query)
-                async for doc in cursor:
-                    # Check if _id matches when converted to string
-                    doc_id = str(doc.get("_id", ""))
-                    if doc_id == cv_id or doc.get("fileId") == cv_id:
-                        resume_doc = doc
-                        logger.info(f"Found document through user search: {doc_id}")
-                        break
-            else:
-                resume_doc = await resumes_col.find_one(query)
-                
-            if resume_doc is not None:
-                logger.info(f"Found document with query: {query}")
-                break
-        
-        # If not found in the primary collection, try the "cvs" collection as well
-        if resume_doc is None:
-            logger.info("Document not found in primary collection, trying 'cvs' collection")
-            # Get the cvs collection that is used by the interviewprep module
-            cvs_col = db.get_collection("cvs")
-            
-            if cvs_col is not None:
-                # Try the same queries in the cvs collection
-                for query in search_queries:
-                    if query is None:
-                        continue
-                        
-                    logger.info(f"Trying query in cvs collection: {query}")
-                    
-                    # For the last query, we need to search differently
-                    if len(query) == 1 and "userId" in query:
-                        # Get all documents for this user
-                        cursor = cvs_col.find(query)
-                        async for doc in cursor:
-                            # Check if _id matches when converted to string
-                            doc_id = str(doc.get("_id", ""))
-                            if doc_id == cv_id or doc.get("fileId") == cv_id:
-                                resume_doc = doc
-                                logger.info(f"Found document in cvs collection through user search: {doc_id}")
-                                break
-                    else:
-                        resume_doc = await cvs_col.find_one(query)
-                        
-                    if resume_doc is not None:
-                        logger.info(f"Found document in cvs collection with query: {query}")
-                        break
-        
-        # Debug log
-        logger.info(f"Available resume: {resume_doc is not None}")
-        
-        if resume_doc is None:
-            # One last attempt - search by substring of _id
-            try:
-                # Find any document where the string representation of _id contains our cv_id
-                pipeline = [
-                    {"$match": {"userId": user_id}},
-                    {"$addFields": {"id_str": {"$toString": "$_id"}}},
-                    {"$match": {"id_str": {"$regex": cv_id, "$options": "i"}}}
-                ]
-                
-                # Try in primary collection
-                cursor = resumes_col.aggregate(pipeline)
-                docs = await cursor.to_list(length=1)
-                
-                if docs and len(docs) > 0:
-                    resume_doc = docs[0]
-                    logger.info(f"Found document through regex search: {resume_doc.get('_id')}")
-                else:
-                    # Try in cvs collection
-                    cvs_col = db.get_collection("cvs")
-                    if cvs_col is not None:
-                        cursor = cvs_col.aggregate(pipeline)
-                        docs = await cursor.to_list(length=1)
-                        
-                        if docs and len(docs) > 0:
-                            resume_doc = docs[0]
-                            logger.info(f"Found document in cvs collection through regex search: {resume_doc.get('_id')}")
-            except Exception as e:
-                logger.error(f"Error in regex search: {e}")
+        # One round trip over resumes and cvs covering ObjectId, string _id and
+        # fileId; the match's lastUsed is bumped in the background
+        resume_doc, source_col = await find_resume_document(cv_id, user_id, RESUME_FALLBACK_PROJECTION, touch=True)
         
-        # If still not found, list available documents for debugging
         if resume_doc is None:
-            logger.warning(f"Resume not found: {cv_id}")
-            
-            # Log all available documents for this user for debugging purposes
-            try:
-                logger.info(f"Listing available documents for user: {user_id}")
-                
-                # Check primary collection
-                if resumes_col is not None:
-                    cursor = resumes_col.find({"userId": user_id})
-                    docs = await cursor.to_list(length=10)
-                    logger.info(f"Found {len(docs)} documents in primary collection")
-                    for doc in docs:
-                        logger.info(f"Document ID: {doc.get('_id')}, fileId: {doc.get('fileId')}")
-                
-                # Check cvs collection
-                cvs_col = db.get_collection("cvs")
-                if cvs_col is not None:
-                    cursor = cvs_col.find({"userId": user_id})
-                    docs = await cursor.to_list(length=10)
-                    logger.info(f"Found {len(docs)} documents in cvs collection")
-                    for doc in docs:
-                        logger.info(f"Document ID: {doc.get('_id')}, fileId: {doc.get('fileId')}")
-            except Exception as e:
-                logger.error(f"Error listing available documents: {e}")
-            
+            logger.warning("Resume not found: %s", cv_id)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Resume not found"
             )
+        logger.debug("Found resume %s in %s collection", cv_id, source_col.name)
         
         # Try all possible fields where text might be stored
-        extracted_text = resume_doc.get("extractedText")
+        extracted_text = await load_resume_text(resume_doc)
         
         # If extractedText is empty or None, try other potential fields
         if extracted_text is None or len(extracted_text.strip()) < 100:
-            logger.warning(f"extractedText field empty or too small, trying content field")
+            logger.warning("extractedText field empty or too small, trying content field")
             extracted_text = resume_doc.get("content")
             
         if extracted_text is None or len(extracted_text.strip()) < 100:
-            logger.warning(f"content field empty or too small, trying text field")
+            logger.warning("content field empty or too small, trying text field")
             extracted_text = resume_doc.get("text")
             
         if extracted_text is None or len(extracted_text.strip()) < 100:
-            logger.warning(f"text field empty or too small, trying cv_text field")
+            logger.warning("text field empty or too small, trying cv_text field")
             extracted_text = resume_doc.get("cv_text")
             
+        # Another upload of the same file may already have its text extracted
+        if (extracted_text is None or len(extracted_text.strip()) < 100) and resume_doc.get("contentHash"):
+            extracted_text = await text_from_same_content(resume_doc, source_col, user_id)
+            
         if extracted_text is None or len(extracted_text.strip()) < 100:
-            logger.warning(f"text fields empty or too small, checking if file exists")
+            logger.warning("text fields empty or too small, checking if file exists")
             
             # If we have a file path, try to extract text from the file
             file_path = resume_doc.get("filePath")
-            if file_path is not None and os.path.exists(file_path):
-                logger.info(f"Attempting to extract text from file: {file_path}")
+            if await stat_regular_file(file_path) is not None:
+                logger.info("Attempting to extract text from file: %s", file_path)
                 try:
-                    extracted_text = extract_text_from_document(file_path, vision_client, openai_client)
+                    extracted_text = await extract_text_from_document_async(file_path, vision_client, openai_client)
                     
                     # Update the document with the newly extracted text
                     if extracted_text is not None and len(extracted_text.strip()) >= 100:
-                        await resumes_col.update_one(
-                            {"_id": resume_doc["_id"]},
-                            {"$set": {"extractedText": extracted_text}}
-                        )
-                        logger.info(f"Updated resume document with newly extracted text")
+                        await replace_resume_text(source_col, resume_doc, extracted_text)
+                        logger.info("Updated resume document with newly extracted text")
                 except Exception as extract_err:
-                    logger.error(f"Error extracting text from file: {extract_err}")
+                    logger.error("Error extracting text from file: %s", extract_err)
         
         # If we still don't have text, try OpenAI to generate placeholder content
         if extracted_text is None or len(extracted_text.strip()) < 100:
-            logger.warning(f"Could not extract text, generating placeholder text with OpenAI")
+            logger.warning("Could not extract text, generating placeholder text with OpenAI")
             
             # Get any information we have
             filename = resume_doc.get("originalName", "")
             
             # Generate placeholder text with OpenAI
-            system_message = "You are an assistant that generates placeholder resume content based on a filename."
-            prompt = f"""
-            I need to generate placeholder content for a resume where the text extraction failed.
-            The resume filename is: {filename}
-            
-            Please generate a generic professional resume with the following sections:
-            1. Summary/Objective
-            2. Work Experience (2-3 positions)
-            3. Education
-            4. Skills
-            5. Contact Information (use placeholder data)
-            
-            Make it realistic but generic so it can reasonably represent many professionals.
-            """
+            prompt = PLACEHOLDER_PROMPT_TEMPLATE.format(filename=filename)
             
             try:
-                extracted_text = call_openai(prompt, system_message)
+                # The placeholder depends only on the filename, so identical names
+                # ("resume.pdf", "CV.pdf", ...) share one generated text
+                extracted_text = await cached_llm_call(
+                    llm_cache_key("placeholder", filename.strip().lower()),
+                    lambda: call_openai(prompt, PLACEHOLDER_SYSTEM_MESSAGE),
+                    "placeholder resume text",
+                    store_if=bool
+                )
                 
                 # Update the document with the generated text
                 if extracted_text is not None:
-                    await resumes_col.update_one(
-                        {"_id": resume_doc["_id"]},
-                        {"$set": {"extractedText": extracted_text}}
-                    )
-                    logger.info(f"Updated resume document with generated placeholder text")
+                    await replace_resume_text(source_col, resume_doc, extracted_text)
+                    logger.info("Updated resume document with generated placeholder text")
             except Exception as openai_err:
-                logger.error(f"Error generating placeholder text: {openai_err}")
+                logger.error("Error generating placeholder text: %s", openai_err)
         
         # Final check - if we still don't have text, raise an exception
         if extracted_text is None or len(extracted_text.strip()) < 100:
-            logger.error(f"Failed to extract or generate resume text for: {cv_id}")
+            logger.error("Failed to extract or generate resume text for: %s", cv_id)
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Failed to extract resume text"
             )
         
-        # Update last used timestamp
-        if "resumes" in resume_doc:
-            collection_for_update = db.get_collection("resumes") 
-        else:
-            collection_for_update = db.get_collection("cvs")
-            
-        if collection_for_update is not None:
-            try:
-                await collection_for_update.update_one(
-                    {"_id": resume_doc["_id"]},
-                    {"$set": {"lastUsed": datetime.utcnow()}}
-                )
-            except Exception as update_err:
-                logger.error(f"Error updating lastUsed timestamp: {update_err}")
-        
+        remember_resume_text(user_id, cv_id, extracted_text)
         return extracted_text
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error in extract_text_with_fallback: {e}")
+        logger.error("Error in extract_text_with_fallback: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error extracting resume text: {str(e)}"
@@ -1626,14 +1970,23 @@ async def debug_resumes(user_id: str):
     """
     Debug endpoint to list all resumes for a user with their IDs in various formats
     """
-    logger.info(f"Debug resumes request for user: {user_id}")
+    logger.info("Debug resumes request for user: %s", user_id)
     
     if resumes_col is None:
         return {"status": "error", "message": "Database not connected"}
     
     try:
-        # Find all resumes for this user
-        cursor = resumes_col.find({"userId": user_id})
+        # Find all resumes for this user; text lengths are measured by Mongo
+        # so the resume bodies never leave the server
+        cursor = resumes_col.aggregate([
+            {"$match": {"userId": user_id}},
+            {"$sort": {"uploadedAt": -1}},
+            {"$limit": 100},
+            {"$project": {
+                "fileId": 1, "originalName": 1, "uploadedAt": 1,
+                "extractedTextLength": RESUME_TEXT_LENGTH_EXPR
+            }}
+        ])
         resumes = await cursor.to_list(length=100)
         
         # Format resume IDs
@@ -1647,7 +2000,7 @@ async def debug_resumes(user_id: str):
                 "fileId": resume.get("fileId"),
                 "filename": resume.get("originalName", ""),
                 "uploadedAt": resume.get("uploadedAt", ""),
-                "extractedTextLength": len(resume.get("extractedText", "")) if resume.get("extractedText") else 0
+                "extractedTextLength": resume.get("extractedTextLength", 0)
             })
             
         return {
@@ -1658,45 +2011,18 @@ async def debug_resumes(user_id: str):
         }
         
     except Exception as e:
-        logger.error(f"Error in debug-resumes: {e}")
+        logger.error("Error in debug-resumes: %s", e)
         return {"status": "error", "message": str(e)}
     
     
     
 # Debug route to find a resume
 @router.get("/debug/find-resume/{cv_id}")
-async def debug_find_resume(cv_id: str, request: Request):
+async def debug_find_resume(cv_id: str, request: Request, user_id: str = Depends(get_current_user_id)):
     """
     Debug endpoint to help find a resume by ID across different collections
     """
-    logger.info(f"Debug find resume: {cv_id}")
-    
-    # Get authentication token
-    token = request.cookies.get("token")
-    if not token:
-        logger.warning("No authentication token found")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Authentication required"
-        )
-        
-    try:
-        # Verify token
-        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-        user_id = payload.get("userId")
-        if not user_id:
-            logger.warning("Invalid token: missing userId")
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication token"
-            )
-        logger.info(f"User authenticated: {user_id}")
-    except jwt.PyJWTError as e:
-        logger.error(f"JWT decode error: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=f"Invalid token: {str(e)}"
-        )
+    logger.info("Debug find resume: %s", cv_id)
     
     # Check MongoDB connection
     if db is None:
@@ -1708,94 +2034,58 @@ async def debug_find_resume(cv_id: str, request: Request):
         
     # Try to find the resume in different collections
     results = {}
+    match = {"userId": user_id, "$or": id_match_clauses(cv_id) + [{"fileId": cv_id}]}
+    # Text length is computed by Mongo; the text itself never leaves the server
+    found_projection = {"fileId": 1, "originalName": 1, "filename": 1, "extractedText_length": RESUME_TEXT_LENGTH_EXPR}
+    listed_collections = {"resumes": resumes_col, "cvs": cvs_col}
     
     try:
-        # Check "resumes" collection
-        resumes = db.get_collection("resumes")
-        if resumes is not None:
-            try:
-                resume_doc = await resumes.find_one({"_id": cv_id, "userId": user_id})
-            except:
-                try:
-                    object_id = ObjectId(cv_id)
-                    resume_doc = await resumes.find_one({"_id": object_id, "userId": user_id})
-                except:
-                    resume_doc = None
-                    
-            if resume_doc is None:
-                resume_doc = await resumes.find_one({"fileId": cv_id, "userId": user_id})
-                
-            if resume_doc is not None:
-                results["resumes"] = {
-                    "found": True,
-                    "id": str(resume_doc.get("_id")),
-                    "fileId": resume_doc.get("fileId"),
-                    "filename": resume_doc.get("originalName", resume_doc.get("filename")),
-                    "extractedText_length": len(resume_doc.get("extractedText", "")) if resume_doc.get("extractedText") else 0
-                }
-            else:
-                # List available resumes
-                cursor = resumes.find({"userId": user_id})
-                available_docs = await cursor.to_list(length=10)
-                available = []
-                for doc in available_docs:
-                    available.append({
-                        "id": str(doc.get("_id")),
-                        "fileId": doc.get("fileId"),
-                        "filename": doc.get("originalName", doc.get("filename"))
-                    })
-                results["resumes"] = {
-                    "found": False,
-                    "available": available
-                }
-        else:
-            results["resumes"] = {"available": False}
-            
-        # Check "cvs" collection
-        cvs = db.get_collection("cvs")
-        if cvs is not None:
-            try:
-                cv_doc = await cvs.find_one({"_id": cv_id, "userId": user_id})
-            except:
-                try:
-                    object_id = ObjectId(cv_id)
-                    cv_doc = await cvs.find_one({"_id": object_id, "userId": user_id})
-                except:
-                    cv_doc = None
-                    
-            if cv_doc is None:
-                cv_doc = await cvs.find_one({"fileId": cv_id, "userId": user_id})
-                
-            if cv_doc is not None:
-                results["cvs"] = {
-                    "found": True,
-                    "id": str(cv_doc.get("_id")),
-                    "fileId": cv_doc.get("fileId"),
-                    "filename": cv_doc.get("originalName", cv_doc.get("filename")),
-                    "extractedText_length": len(cv_doc.get("extractedText", "")) if cv_doc.get("extractedText") else 0
-                }
-            else:
-                # List available CVs
-                cursor = cvs.find({"userId": user_id})
-                available_docs = await cursor.to_list(length=10)
-                available = []
-                for doc in available_docs:
-                    available.append({
+        # Both collections in one round trip; _source tags where each match lives
+        cursor = resumes_col.aggregate([
+            {"$match": match},
+            {"$project": {**found_projection, "_source": {"$literal": "resumes"}}},
+            {"$unionWith": {"coll": "cvs", "pipeline": [
+                {"$match": match},
+                {"$project": {**found_projection, "_source": {"$literal": "cvs"}}}
+            ]}}
+        ])
+        found = {}
+        for doc in await cursor.to_list(length=None):
+            found.setdefault(doc["_source"], doc)
+        
+        for name, doc in found.items():
+            results[name] = {
+                "found": True,
+                "id": str(doc.get("_id")),
+                "fileId": doc.get("fileId"),
+                "filename": doc.get("originalName", doc.get("filename")),
+                "extractedText_length": doc.get("extractedText_length", 0)
+            }
+        
+        # List what is available in the collections without a match, concurrently
+        missing = [name for name in listed_collections if name not in found]
+        listings = await asyncio.gather(*(
+            listed_collections[name].find({"userId": user_id}, RESUME_LISTING_PROJECTION).to_list(length=10)
+            for name in missing
+        ))
+        for name, available_docs in zip(missing, listings):
+            results[name] = {
+                "found": False,
+                "available": [
+                    {
                         "id": str(doc.get("_id")),
                         "fileId": doc.get("fileId"),
                         "filename": doc.get("originalName", doc.get("filename"))
-                    })
-                results["cvs"] = {
-                    "found": False,
-                    "available": available
-                }
-        else:
-            results["cvs"] = {"available": False}
-            
-        return results
+                    }
+                    for doc in available_docs
+                ]
+            }
+        
+        # Keep the resumes-then-cvs key order of the response
+        return {name: results[name] for name in listed_collections}
         
     except Exception as e:
-        logger.error(f"Error in debug_find_resume: {e}")
+        logger.error("Error in debug_find_resume: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error finding resume: {str(e)}"
@@ -1,28 +1,115 @@
 import os
-import uuid
-import random
+import time
 import logging
+import stat
+import asyncio
+import aiofiles
+import aiofiles.os
 import jwt
 import motor.motor_asyncio
+import re
 import json
+import mmap
+import base64
+import hashlib
 from bson import ObjectId
 from typing import Dict, Optional, List
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, status, Request, Body, Header, Cookie
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Body, Header, Cookie, BackgroundTasks
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 
 logger = logging.getLogger("futureforceai")
 
 from .interviewprep import (
-    conversations_col, SECRET_KEY, 
+    SECRET_KEY, 
     MAX_INTERVIEW_QUESTIONS, call_openai,
-    extract_text_from_document, vision_client, openai_client
+    vision_client, openai_client, async_openai_client,
+    new_session_id
 )
+from .pdf_extraction import extract_text_from_document_async
+from .cv_utils import (
+    extracted_text_fields, MIN_CV_TEXT_CHARS, TTLCache, decode_token,
+    clean_filename, generate_timestamp_id, ensure_uploads_dir
+)
+
+
+# Caps how many CV extractions (local parsers, Vision and OpenAI OCR) run at
+# once across interview starts, so a burst can't fan out into rate-limit storms
+CV_EXTRACTION_CONCURRENCY = int(os.getenv("CV_EXTRACTION_CONCURRENCY", "4"))
+cv_extraction_semaphore = asyncio.Semaphore(CV_EXTRACTION_CONCURRENCY)
+
+async def extract_cv_text(path: str) -> str:
+    """
+    Extract a CV's text off the event loop, within the extraction concurrency
+    cap. Repeat extractions of the same file content are served from the
+    content-hash cache in pdf_extraction.
+    """
+    async with cv_extraction_semaphore:
+        return await extract_text_from_document_async(path, vision_client, openai_client)
 
 
 router = APIRouter()
 
+# This router keeps its own Motor client, sized for its workload and created on
+# startup inside the worker's event loop; until then the handles stay None
+MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://host.docker.internal:27017")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "10"))
+
+client = None
+db = None
+conversations_col = None
+
+@router.on_event("startup")
+async def connect_mongo():
+    """Create the Motor client and open its minimum pool before the first request"""
+    global client, db, conversations_col
+    try:
+        client = motor.motor_asyncio.AsyncIOMotorClient(
+            MONGODB_URI,
+            maxPoolSize=MONGO_MAX_POOL_SIZE,
+            minPoolSize=MONGO_MIN_POOL_SIZE,
+            maxIdleTimeMS=300000,
+            waitQueueTimeoutMS=2000,
+            serverSelectionTimeoutMS=3000,
+            retryWrites=True,
+            appname="futureforceai-saved-cv"
+        )
+        db = client["futureforceai"]
+        conversations_col = db["conversations"]
+    except Exception as e:
+        logger.error(f"Failed to connect to MongoDB: {e}")
+        return
+    try:
+        # Connect now rather than on the first user request
+        await client.admin.command("ping")
+        logger.info("MongoDB connection established")
+    except Exception as e:
+        logger.warning(f"MongoDB not reachable at startup, will connect on demand: {e}")
+        return
+    try:
+        # The one piece of the CV lookup that doesn't depend on the caller's
+        # identity; resolve it now so no request waits on it
+        await get_cv_collection_names()
+        await create_cv_indexes()
+    except Exception as e:
+        logger.warning(f"Could not list CV collections at startup: {e}")
+
+@router.on_event("startup")
+async def create_uploads_dir():
+    """Create the uploads directory once per process instead of on each request"""
+    try:
+        await asyncio.to_thread(ensure_uploads_dir)
+    except OSError as e:
+        logger.warning(f"Could not create uploads directory at startup: {e}")
+
+@router.on_event("shutdown")
+async def close_mongo():
+    if client is not None:
+        client.close()
+
+
 class SavedCVInterviewRequest(BaseModel):
     job_role: str
     cv_id: str
@@ -45,50 +132,216 @@ async def get_token_from_request(request: Request):
     return token
 
 
-def ensure_uploads_dir():
-    """Ensure the uploads directory exists in the FastAPI container"""
-    uploads_dir = "/app/uploads"
-    os.makedirs(uploads_dir, exist_ok=True)
-    logger.info(f"Ensuring uploads directory exists: {uploads_dir}")
-    return uploads_dir
+# Collections CV documents may live in, in lookup order. Which of them exist is
+# cached rather than listed per request. An empty result is re-listed after
+# CV_COLLECTIONS_CACHE_SECONDS, since the first upload creates the collection.
+CV_COLLECTION_NAMES = ["cvs", "CV", "cv"]
+CV_COLLECTIONS_CACHE_SECONDS = 30
+_cv_collections_cache: Optional[tuple] = None
+_cv_collections_lock = asyncio.Lock()
+
+async def get_cv_collection_names() -> List[str]:
+    """The CV_COLLECTION_NAMES that exist in the database, in lookup order"""
+    global _cv_collections_cache
+    async with _cv_collections_lock:
+        if _cv_collections_cache is not None:
+            names, cached_until = _cv_collections_cache
+            if names or time.time() < cached_until:
+                return names
+        existing = set(await db.list_collection_names())
+        names = [name for name in CV_COLLECTION_NAMES if name in existing]
+        logger.debug("CV collections in database: %s", names)
+        _cv_collections_cache = (names, time.time() + CV_COLLECTIONS_CACHE_SECONDS)
+        return names
+
+# Server-side cap on each CV query, so a slow collection can't hold the
+# handler; an overrun is logged and treated like a miss for that collection
+CV_QUERY_MAX_TIME_MS = int(os.getenv("CV_QUERY_MAX_TIME_MS", "500"))
+
+# Every lookup stage filters on userId: with _id or fileId, or with a filename
+# prefix. resume_analyzer indexes cvs only, so the legacy CV/cv collections get
+# their indexes here.
+CV_LOOKUP_INDEXES = [
+    [("userId", 1), ("_id", 1)],
+    [("userId", 1), ("fileId", 1)],
+    [("userId", 1), ("filename", 1)],
+]
+
+async def create_cv_indexes():
+    """Ensure the CV lookup indexes exist on every CV collection; no-ops if present"""
+    for name in await get_cv_collection_names():
+        for keys in CV_LOOKUP_INDEXES:
+            try:
+                await db[name].create_index(keys, background=True)
+            except Exception as e:
+                logger.error(f"Error creating index {keys} on {name}: {e}")
+
+# Fields start_interview_with_saved_cv reads from a CV document: its text, and
+# what get_potential_file_paths needs to locate the file; skips OCR blobs and the
+# like. The legacy content field is only fetched when extractedText is missing.
+CV_DOCUMENT_PROJECTION = {
+    "userId": 1, "extractedText": 1, "extractedTextReady": 1,
+    "filePath": 1, "fileId": 1, "filename": 1, "originalName": 1,
+    "cvTextSummary": 1, "cvTextSummaryHash": 1,
+    "openaiFileId": 1, "openaiFilePath": 1
+}
+
+# The conversation document is re-read on every interview turn and its cv_text
+# goes into every prompt, so longer CVs are stored as a summary; the full text
+# stays on the CV document referenced by cv_id
+CV_TEXT_INLINE_LIMIT = 8000
+
+CV_SUMMARY_PROMPT = (
+    "Summarize the following CV in about 300 words of plain text (not JSON). "
+    "Keep the candidate's roles, employers, dates, skills, education and notable "
+    "achievements, since interview questions will be based on them.\n\n"
+    "CV:\n{cv_text}"
+)
+
+async def conversation_cv_text(cv_text: str, cv_document: dict, pending_update: dict) -> str:
+    """
+    The CV text to store with an interview session: the text itself when short,
+    otherwise a summary generated once per CV text and kept on the CV document
+    (added to pending_update, written with the rest of the request's changes).
+    Falls back to truncating if the summary can't be generated.
+    """
+    if len(cv_text) <= CV_TEXT_INLINE_LIMIT:
+        return cv_text
+    text_hash = hashlib.sha256(cv_text.encode("utf-8")).hexdigest()
+    if cv_document.get("cvTextSummaryHash") == text_hash and cv_document.get("cvTextSummary"):
+        return cv_document["cvTextSummary"]
+    try:
+        summary = await asyncio.to_thread(call_openai, CV_SUMMARY_PROMPT.format(cv_text=cv_text))
+    except Exception as e:
+        logger.error(f"CV summary failed, truncating instead: {e}")
+        summary = None
+    if not summary:
+        return cv_text[:CV_TEXT_INLINE_LIMIT]
+    pending_update.update({"cvTextSummary": summary, "cvTextSummaryHash": text_hash})
+    return summary
+
+
+# A CV stored as plain text is far below this; reading more just to fail the
+# length check wastes memory on large binaries
+CV_RAW_READ_LIMIT = 1 << 20
+
+# Above this size a file is base64-encoded straight from a memory map
+VISION_MMAP_THRESHOLD = 1 << 20
+
+# Largest CV file sent to Vision, inline or uploaded; OpenAI caps file inputs at 32 MB
+VISION_MAX_FILE_BYTES = 32 << 20
 
-def generate_timestamp_id() -> str:
+def encode_file_base64(path: str) -> str:
     """
-    Generate a timestamp-based ID for consistent file naming.
-    Format: YYYYMMDD-HHMMSS-random_suffix
+    Base64 of a file's bytes, for images in the Vision fallback. Blocking: run
+    it in a thread. Large files are mapped instead of copied into a bytes object first.
     """
-    timestamp = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
-    random_suffix = ''.join(random.choices('abcdefghijklmnopqrstuvwxyz0123456789', k=6))
-    return f"{timestamp}-{random_suffix}"
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size > VISION_MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return base64.b64encode(mapped).decode("ascii")
+        return base64.b64encode(f.read()).decode("ascii")
 
-def clean_filename(filename: str) -> str:
+async def openai_file_id(cv_document: dict, file_path: str, pending_update: dict) -> str:
+    """
+    OpenAI file ID of a CV PDF for the Vision fallback. The file is uploaded once
+    and the ID kept on the CV document along with its path (via pending_update),
+    so a later attempt on the same file references it instead of resending it.
+    """
+    if cv_document.get("openaiFileId") and cv_document.get("openaiFilePath") == file_path:
+        return cv_document["openaiFileId"]
+    async with aiofiles.open(file_path, "rb") as f:
+        content = await f.read(VISION_MAX_FILE_BYTES + 1)
+    if len(content) > VISION_MAX_FILE_BYTES:
+        raise ValueError(f"{file_path} is larger than {VISION_MAX_FILE_BYTES} bytes")
+    uploaded = await async_openai_client.files.create(
+        file=(os.path.basename(file_path), content, "application/pdf"),
+        purpose="user_data"
+    )
+    logger.info(f"Uploaded {file_path} to OpenAI as {uploaded.id}")
+    pending_update.update({"openaiFileId": uploaded.id, "openaiFilePath": file_path})
+    return uploaded.id
+
+async def delete_openai_file(file_id: str) -> None:
     """
-    Clean a filename to avoid special characters and spaces.
+    Delete a CV uploaded for Vision once its text is stored, so OpenAI doesn't
+    keep a copy. Runs as a background task after the response; failures are logged.
     """
-    return filename.replace(' ', '_').replace('/', '_').replace('\\', '_')
+    try:
+        await async_openai_client.files.delete(file_id)
+        logger.info(f"Deleted OpenAI file {file_id}")
+    except Exception as e:
+        logger.error(f"Failed to delete OpenAI file {file_id}: {e}")
+
+# Formats whose raw bytes are never the CV text: decoding them with
+# errors='ignore' only yields noise that can still pass the length check
+BINARY_CV_EXTENSIONS = {".pdf", ".doc", ".docx", ".odt", ".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tif", ".tiff", ".webp"}
+
+# Leading bytes of the same formats, for files whose name doesn't say what they
+# are: PDF, PNG, JPEG, GIF, ZIP containers (docx/odt) and legacy Word documents
+BINARY_CV_SIGNATURES = (b"%PDF", b"\x89PNG", b"\xff\xd8\xff", b"GIF8", b"PK\x03\x04", b"\xd0\xcf\x11\xe0")
+
+async def existing_file_paths(paths: List[str]) -> List[str]:
+    """
+    The paths that are regular files, in order, one per distinct file; one
+    concurrent async stat each. Naming conventions often lead to the same file
+    (e.g. ./uploads and /app/uploads in the container), and every step after
+    this - extraction, a paid Vision call - would otherwise repeat per alias.
+    """
+    unique_paths = list(dict.fromkeys(paths))
+    stats = await asyncio.gather(*(aiofiles.os.stat(path) for path in unique_paths), return_exceptions=True)
+    files = {}
+    for path, st in zip(unique_paths, stats):
+        if isinstance(st, os.stat_result) and stat.S_ISREG(st.st_mode):
+            files.setdefault((st.st_dev, st.st_ino), path)
+    return list(files.values())
+
+
+async def update_cv_document(collection, doc_id, fields: dict) -> None:
+    """
+    Apply everything a request learned about a CV (extracted text, the path it
+    came from, a summary) to the CV document in one write. Runs as a background
+    task after the response; failures are logged.
+    """
+    try:
+        await collection.update_one(
+            {"_id": doc_id},
+            {"$set": {**fields, "lastUsed": datetime.utcnow()}}
+        )
+        logger.info(f"Updated CV document fields: {sorted(fields)}")
+    except Exception as update_err:
+        logger.error(f"Failed to update CV document: {update_err}")
+
+def has_enough_text(text: Optional[str], min_chars: int = MIN_CV_TEXT_CHARS) -> bool:
+    """
+    len(text.strip()) >= min_chars, without copying the text in the common case:
+    too-short text fails on its raw length, and text that doesn't start or end
+    with whitespace would be unchanged by strip()
+    """
+    if not text or len(text) < min_chars:
+        return False
+    if not text[0].isspace() and not text[-1].isspace():
+        return True
+    return len(text.strip()) >= min_chars
 
 def get_potential_file_paths(cv_document: Dict) -> List[str]:
     """
-    Generate a list of potential file paths based on CV document metadata.
+    Generate a list of potential file paths based on CV document metadata,
+    normalized and without duplicates, in order of preference.
     """
     potential_paths = []
+    original_name = cv_document.get('originalName') or ''
+    clean_original = clean_filename(original_name)
 
     if "filePath" in cv_document and cv_document["filePath"]:
         potential_paths.append(cv_document["filePath"])
     
     if "fileId" in cv_document and cv_document["fileId"]:
         file_id = cv_document["fileId"]
-        original_name = cv_document.get('originalName', '')
-        clean_original = clean_filename(original_name)
-        
         potential_paths.append(f"/app/uploads/{file_id}_{clean_original}")
         potential_paths.append(f"./uploads/{file_id}_{clean_original}")
 
     doc_id = str(cv_document["_id"])
-    original_name = cv_document.get('originalName', '')
-    clean_original = clean_filename(original_name)
-    
-
     potential_paths.append(f"/app/uploads/{doc_id}_{clean_original}")
     potential_paths.append(f"./uploads/{doc_id}_{clean_original}")
 
@@ -107,19 +360,78 @@ def get_potential_file_paths(cv_document: Dict) -> List[str]:
         potential_paths.append(f"/uploads/{filename}")
     
   
-    if 'originalName' in cv_document:
-        original_name = cv_document.get('originalName')
+    if original_name:
         potential_paths.append(f"./uploads/{original_name}")
         potential_paths.append(f"/app/uploads/{original_name}")
         potential_paths.append(f"../frontend/uploads/{original_name}")
         potential_paths.append(f"/app/frontend/uploads/{original_name}")
     
-    return potential_paths
+    # filePath often repeats one of the derived paths; each duplicate would cost a stat
+    return list(dict.fromkeys(os.path.normpath(path) for path in potential_paths))
+
+# CV text as stored with the last session started from each (user, CV), so a
+# repeat start skips the Mongo lookup, file stats and extraction. Per worker; the
+# TTL bounds how long a re-uploaded CV can be served stale.
+SESSION_CV_TEXT_CACHE_TTL_SECONDS = 600
+SESSION_CV_TEXT_CACHE_MAX_SIZE = 2000
+_session_cv_text_cache = TTLCache(SESSION_CV_TEXT_CACHE_MAX_SIZE)
+
+def remember_session_cv_text(user_id: str, cv_id: str, cv_text: str) -> None:
+    _session_cv_text_cache.set((user_id, cv_id), cv_text, SESSION_CV_TEXT_CACHE_TTL_SECONDS)
+
+def recall_session_cv_text(user_id: str, cv_id: str) -> Optional[str]:
+    return _session_cv_text_cache.get((user_id, cv_id))
+
+async def create_interview_session(user_id: str, data: SavedCVInterviewRequest, session_cv_text: str) -> JSONResponse:
+    """Store a new interview session for the CV text and return its ID and first message"""
+    session_id, session_uuid = new_session_id()
+    logger.info(f"Generated session ID: {session_id}")
+    
+
+    initial_ai_text = (
+        f"Thank you for selecting your CV for the {data.job_role} position. "
+        "Let's begin the interview. Can you tell me about yourself?"
+    )
+
+    conversation_doc = {
+        "session_id": session_id,
+        "session_uuid": session_uuid,
+        "user_id": user_id,
+        "job_role": data.job_role,
+        "cv_text": session_cv_text,
+        "messages": [{"sender": "ai", "text": initial_ai_text}],
+        "created_at": datetime.utcnow(),
+        "finished": False,
+        "max_questions": MAX_INTERVIEW_QUESTIONS,
+        "cv_id": data.cv_id 
+    }
+    
+   
+    if conversations_col is not None:
+        try:
+            # The driver assigns _id client side, so the insert is a single round trip
+            await conversations_col.insert_one(conversation_doc)
+            logger.info(f"Saved conversation to MongoDB: {session_id}")
+        except Exception as db_err:
+            logger.error(f"MongoDB error: {db_err}")
+           
+    else:
+        logger.warning("MongoDB not available, session not saved")
+    
+   
+    response_data = {
+        "session_id": session_id,
+        "first_ai_message": {"sender": "ai", "text": initial_ai_text}
+    }
+    
+    logger.info(f"Returning response: {response_data}")
+    return JSONResponse(content=response_data)
 
 @router.post("/api/interview/start-with-saved-cv")
 async def start_interview_with_saved_cv(
     request: Request,
     data: SavedCVInterviewRequest,
+    background_tasks: BackgroundTasks,
     authorization: Optional[str] = Header(None),
 ):
     """
@@ -128,9 +440,6 @@ async def start_interview_with_saved_cv(
     logger.info(f"Starting interview for job role: {data.job_role} with CV ID: {data.cv_id}")
     
     try:
-        ensure_uploads_dir()
-        
-
         token = await get_token_from_request(request)
         
         if not token and authorization:
@@ -138,11 +447,13 @@ async def start_interview_with_saved_cv(
                 token = authorization[7:]
                 logger.info("Token found in Authorization header")
                 
-        logger.info("Request headers:")
-        for header_name, header_value in request.headers.items():
-            logger.info(f"  {header_name}: {header_value if header_name.lower() != 'authorization' else '[REDACTED]'}")
-            
-        logger.info(f"Request cookies: {request.cookies}")
+        # Header dumps are for troubleshooting only; credentials are left out
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "Request headers: %s, cookies: %s",
+                {name: value for name, value in request.headers.items() if name not in ('authorization', 'cookie')},
+                list(request.cookies)
+            )
 
         if not token:
             logger.warning("No authentication token found in any source")
@@ -151,11 +462,9 @@ async def start_interview_with_saved_cv(
                 content={"detail": "Authentication required"}
             )
             
-        logger.info(f"Using token: {token[:10]}...")
-        
 
         try:
-            payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+            payload = decode_token(token, SECRET_KEY)
             user_id = payload.get("userId")
             if not user_id:
                 logger.warning("Invalid token: missing userId")
@@ -180,105 +489,60 @@ async def start_interview_with_saved_cv(
             )
         
 
-        db = conversations_col.database
-
-        cv_collection = db.get_collection("cvs")
-        
-        if cv_collection is None:
-            logger.error("CV collection not found in database")
+        if db is None:
+            logger.error("MongoDB not connected")
             return JSONResponse(
-                status_code=500,
-                content={"detail": "CV storage not available"}
+                status_code=503,
+                content={"detail": "Database unavailable"}
             )
-        
+
+        # A repeat start with the same CV skips the lookup and extraction entirely
+        cached_cv_text = recall_session_cv_text(user_id, data.cv_id)
+        if cached_cv_text is not None:
+            logger.info(f"Using cached CV text for CV {data.cv_id}")
+            return await create_interview_session(user_id, data, cached_cv_text)
 
         cv_document = None
-        collections_to_check = ["cvs", "CV", "cv"]
         current_collection = None
  
-        collections = await db.list_collection_names()
-        logger.info(f"Available collections in database: {collections}")
-
-        for collection_name in collections_to_check:
-            if collection_name in collections:
-                collection = db.get_collection(collection_name)
-                try:
-                    logger.info(f"Checking for fileId in collection: {collection_name}")
-                    cv_document = await collection.find_one({"fileId": data.cv_id})
-                    if cv_document:
-                        logger.info(f"Found CV with fileId in collection: {collection_name}")
-                        current_collection = collection
-                        break
-                except Exception as e:
-                    logger.error(f"Error searching by fileId: {e}")
-
-        if cv_document is None:
-            for collection_name in collections_to_check:
-                if collection_name in collections:
-                    logger.info(f"Checking collection: {collection_name}")
-                    collection = db.get_collection(collection_name)
-       
-                    if len(data.cv_id) == 24:
-                        try:
-                            logger.info(f"Trying with ObjectId: {data.cv_id}")
-                            object_id = ObjectId(data.cv_id)
-                            cv_document = await collection.find_one({"_id": object_id})
-                            if cv_document:
-                                current_collection = collection
-                        except Exception as id_err:
-                            logger.error(f"Error converting to ObjectId: {id_err}")
- 
-                    if cv_document is None:
-                        try:
-                            logger.info(f"Trying with string ID: {data.cv_id}")
-                            cv_document = await collection.find_one({"_id": data.cv_id})
-                            if cv_document:
-                                current_collection = collection
-                        except Exception as e:
-                            logger.error(f"Error searching with string ID: {e}")
-                    
-
-                    if cv_document is not None:
-                        logger.info(f"Found CV in collection: {collection_name}")
-                        break
-        
-
-        if cv_document is None:
-            logger.warning(f"CV not found with user filter, trying broader search")
-            for collection_name in collections_to_check:
-                if collection_name in collections:
-                    collection = db.get_collection(collection_name)
-                    
-
-                    try:
-                        if len(data.cv_id) == 24:
-                            cv_document = await collection.find_one({"_id": ObjectId(data.cv_id)})
-                        else:
-                            cv_document = await collection.find_one({"_id": data.cv_id})
-                            
-                        if cv_document:
-                            current_collection = collection
-                    except Exception as e:
-                        logger.error(f"Error in broader search: {e}")
-                    
-                    if cv_document is not None:
-                        logger.info(f"Found CV in collection {collection_name} without user filtering")
-                        break
-
-        if cv_document is None:
-            logger.warning(f"CV not found by ID, trying filename search")
-            for collection_name in collections_to_check:
-                if collection_name in collections:
-                    collection = db.get_collection(collection_name)
-
-                    try:
-                        cv_document = await collection.find_one({"filename": {"$regex": data.cv_id}})
-                        if cv_document:
-                            logger.info(f"Found CV by filename regex in {collection_name}")
-                            current_collection = collection
-                            break
-                    except Exception as e:
-                        logger.error(f"Error in filename search: {e}")
+        cv_collections = [db.get_collection(name) for name in await get_cv_collection_names()]
+
+        # Validate the ID up front instead of catching InvalidId; the $or
+        # branches line up with the (userId, _id) and (userId, fileId) indexes
+        object_id = ObjectId(data.cv_id) if ObjectId.is_valid(data.cv_id) else None
+        id_clauses = ([{"_id": object_id}] if object_id is not None else []) + [{"_id": data.cv_id}]
+
+        # Every stage is scoped to the caller, so the query itself authorizes
+        # access: the user's CV by ID; a CV saved before documents carried a
+        # userId, by _id only; then the user's CV by filename. Each stage is one
+        # query per collection, run concurrently, and the earliest collection wins.
+        lookup_stages = [
+            ("user", {"userId": user_id, "$or": id_clauses + [{"fileId": data.cv_id}]}),
+            ("unowned", {"userId": {"$exists": False}, "$or": id_clauses}),
+            # Stored filenames start with the file ID, so an anchored prefix
+            # regex matches them and can walk the (userId, filename) index
+            ("filename", {"userId": user_id, "filename": {"$regex": "^" + re.escape(data.cv_id)}}),
+        ]
+        for stage, query in lookup_stages:
+            results = await asyncio.gather(
+                *(
+                    collection.find_one(query, CV_DOCUMENT_PROJECTION, max_time_ms=CV_QUERY_MAX_TIME_MS)
+                    for collection in cv_collections
+                ),
+                return_exceptions=True
+            )
+            for collection, result in zip(cv_collections, results):
+                if isinstance(result, asyncio.CancelledError):
+                    raise result
+                if isinstance(result, Exception):
+                    logger.error(f"Error searching collection {collection.name} ({stage} lookup): {result}")
+                elif result is not None and cv_document is None:
+                    cv_document = result
+                    current_collection = collection
+            if cv_document is not None:
+                logger.info(f"Found CV in collection {current_collection.name} ({stage} lookup)")
+                break
+            logger.warning(f"CV not found by {stage} lookup")
         
 
         if cv_document is not None:
@@ -306,90 +570,88 @@ async def start_interview_with_saved_cv(
             logger.info("Using 'extractedText' field from CV document")
             cv_text = cv_document['extractedText']
 
-        if not cv_text and 'content' in cv_document and cv_document['content']:
-            logger.info("Using 'content' field from CV document")
-            cv_text = cv_document['content']
+        if not cv_text:
+            try:
+                content_doc = await current_collection.find_one(
+                    {"_id": cv_document["_id"]}, {"content": 1}, max_time_ms=CV_QUERY_MAX_TIME_MS
+                )
+            except Exception as e:
+                logger.error(f"Error reading CV content field: {e}")
+                content_doc = None
+            if content_doc and content_doc.get('content'):
+                logger.info("Using 'content' field from CV document")
+                cv_text = content_doc['content']
         
 
+        # Whether cv_text is usable; checked once here and kept up to date by
+        # each step below instead of re-measuring the text. Documents saved with
+        # extractedTextReady already record the answer for their stored text.
+        cv_text_ok = bool(cv_text) and (
+            cv_document.get("extractedTextReady") is True or has_enough_text(cv_text)
+        )
+
+        # Fields to write back to the CV document, collected across the branches
+        # below and saved in a single update once the session is created
+        pending_update = {}
+
+        # Set once the CV's files have been located and tried below
+        valid_paths = None
         if not cv_text:
             potential_paths = get_potential_file_paths(cv_document)
             
             logger.info(f"Trying these potential file paths: {potential_paths}")
             
+            # Every later step (extraction, raw read, Vision, recovery) works
+            # from this one concurrent stat pass
+            valid_paths = await existing_file_paths(potential_paths)
+            
             extracted = False
-            for path in potential_paths:
-                if os.path.exists(path):
-                    logger.info(f"Found file at path: {path}")
+            for path in valid_paths:
+                logger.info(f"Found file at path: {path}")
+                try:
+                    cv_text = await extract_cv_text(path)
+                    if has_enough_text(cv_text):
+                        logger.info(f"Successfully extracted {len(cv_text)} chars from file at {path}")
+                        extracted = True
+                        pending_update.update({**extracted_text_fields(cv_text), "filePath": path})
+                        break
+                    else:
+                        logger.warning(f"Extraction produced insufficient text from {path}: {len(cv_text) if cv_text else 0} chars")
+                except Exception as e:
+                    logger.error(f"Error extracting text from {path}: {e}")
+                    
+
+                if not extracted and os.path.splitext(path)[1].lower() not in BINARY_CV_EXTENSIONS:
                     try:
-                        cv_text = extract_text_from_document(path, vision_client, openai_client)
-                        if cv_text and len(cv_text.strip()) >= 100:
-                            logger.info(f"Successfully extracted {len(cv_text)} chars from file at {path}")
+                        async with aiofiles.open(path, 'rb') as f:
+                            file_content = await f.read(CV_RAW_READ_LIMIT)
+                        if file_content.startswith(BINARY_CV_SIGNATURES):
+                            # Don't decode binary content into noise; Vision handles it below
+                            logger.info(f"Skipping direct read of binary file at {path}")
+                            continue
+                        try:
+                            cv_text = file_content.decode('utf-8', errors='ignore')
+                        except:
+                            pass
+                            
+                        if has_enough_text(cv_text):
+                            logger.info(f"Successfully read {len(cv_text)} chars from file at {path}")
                             extracted = True
-             
-                            try:
-                                await current_collection.update_one(
-                                    {"_id": cv_document["_id"]},
-                                    {"$set": {
-                                        "extractedText": cv_text,
-                                        "filePath": path,  
-                                        "lastUsed": datetime.utcnow() 
-                                    }}
-                                )
-                                logger.info("Updated CV document with extracted text and correct path")
-                            except Exception as update_err:
-                                logger.error(f"Failed to update CV document: {update_err}")
-                                
+                            pending_update.update({**extracted_text_fields(cv_text), "filePath": path})
                             break
                         else:
-                            logger.warning(f"Extraction produced insufficient text from {path}: {len(cv_text) if cv_text else 0} chars")
-                    except Exception as e:
-                        logger.error(f"Error extracting text from {path}: {e}")
-                        
-
-                    if not extracted:
-                        try:
-                            with open(path, 'rb') as f:  
-                                file_content = f.read()
-                                try:
-                                    cv_text = file_content.decode('utf-8', errors='ignore')
-                                except:
-                                    pass
-                                
-                            if cv_text and len(cv_text.strip()) >= 100:
-                                logger.info(f"Successfully read {len(cv_text)} chars from file at {path}")
-                                extracted = True
-                                
-
-                                try:
-                                    await current_collection.update_one(
-                                        {"_id": cv_document["_id"]},
-                                        {"$set": {
-                                            "extractedText": cv_text,
-                                            "filePath": path,  
-                                            "lastUsed": datetime.utcnow()  
-                                        }}
-                                    )
-                                    logger.info("Updated CV document with extracted text and correct path")
-                                except Exception as update_err:
-                                    logger.error(f"Failed to update CV document: {update_err}")
-                                
-                                break
-                            else:
-                                logger.warning(f"Direct file read produced insufficient text from {path}")
-                        except Exception as read_err:
-                            logger.error(f"Error reading file from {path}: {read_err}")
+                            logger.warning(f"Direct file read produced insufficient text from {path}")
+                    except Exception as read_err:
+                        logger.error(f"Error reading file from {path}: {read_err}")
             
             if not extracted:
                 logger.error(f"Could not find readable file at any of these paths: {potential_paths}")
                     
 
-            valid_paths = [path for path in potential_paths if os.path.exists(path)]
-            
-            if (not cv_text or len(cv_text.strip()) < 100) and valid_paths and openai_client is not None:
+            # Only when no file yielded usable text; a successful extraction skips straight on
+            if not extracted and valid_paths and async_openai_client is not None:
                 logger.info(f"Attempting OpenAI Vision extraction as last resort")
                 try:
-                    import base64
-
                     for file_path in valid_paths:
 
                         file_ext = os.path.splitext(file_path)[1].lower()
@@ -398,41 +660,45 @@ async def start_interview_with_saved_cv(
                         logger.info(f"Trying OpenAI Vision extraction with file: {file_path} (content type: {content_type})")
 
                         try:
-                            with open(file_path, "rb") as f:
-                                file_content = f.read()
-                            file_b64 = base64.b64encode(file_content).decode('utf-8')
-
-                            response = openai_client.chat.completions.create(
-                                model="gpt-4.1-mini",
-                                messages=[
-                                    {"role": "system", "content": "You are a helpful assistant that extracts text from CV/resume documents."},
-                                    {"role": "user", "content": [
-                                        {"type": "text", "text": "Extract all the text content from this CV/resume document. Include all sections like personal info, education, experience, skills, etc."},
-                                        {"type": "image_url", "image_url": {"url": f"data:{content_type};base64,{file_b64}"}}
-                                    ]}
-                                ],
-                                max_tokens=4000
-                            )
+                            file_size = (await aiofiles.os.stat(file_path)).st_size
+                            if file_size > VISION_MAX_FILE_BYTES:
+                                logger.warning(f"Skipping Vision for {file_path}: {file_size} bytes is over the limit")
+                                continue
+
+                            # PDFs go by file ID, raw bytes uploaded once; images inline
+                            vision_file_id = None
+                            if file_ext == '.pdf':
+                                vision_file_id = await openai_file_id(cv_document, file_path, pending_update)
+                                file_part = {"type": "file", "file": {"file_id": vision_file_id}}
+                            else:
+                                file_b64 = await asyncio.to_thread(encode_file_base64, file_path)
+                                file_part = {"type": "image_url", "image_url": {"url": f"data:{content_type};base64,{file_b64}"}}
+
+                            # Under the same cap as the other extractors
+                            async with cv_extraction_semaphore:
+                                response = await async_openai_client.chat.completions.create(
+                                    model="gpt-4.1-mini",
+                                    messages=[
+                                        {"role": "system", "content": "You are a helpful assistant that extracts text from CV/resume documents."},
+                                        {"role": "user", "content": [
+                                            {"type": "text", "text": "Extract all the text content from this CV/resume document. Include all sections like personal info, education, experience, skills, etc."},
+                                            file_part
+                                        ]}
+                                    ],
+                                    max_tokens=4000
+                                )
                             
                             openai_text = response.choices[0].message.content
-                            if openai_text and len(openai_text.strip()) > 100:
+                            if has_enough_text(openai_text):
                                 logger.info(f"OpenAI Vision extracted {len(openai_text)} characters from {file_path}")
                                 cv_text = openai_text
-                                
-
-                                try:
-                                    await current_collection.update_one(
-                                        {"_id": cv_document["_id"]},
-                                        {"$set": {
-                                            "extractedText": cv_text,
-                                            "filePath": file_path,
-                                            "lastUsed": datetime.utcnow()
-                                        }}
-                                    )
-                                    logger.info("Updated CV document with extracted text and correct path")
-                                    break  
-                                except Exception as update_err:
-                                    logger.error(f"Failed to update CV document with extracted text: {update_err}")
+                                extracted = True
+                                pending_update.update({**extracted_text_fields(cv_text), "filePath": file_path})
+                                if vision_file_id is not None:
+                                    # The stored text replaces the upload from here on
+                                    background_tasks.add_task(delete_openai_file, vision_file_id)
+                                    pending_update.update({"openaiFileId": None, "openaiFilePath": None})
+                                break
                             else:
                                 logger.warning(f"OpenAI Vision extraction from {file_path} produced insufficient text: {len(openai_text) if openai_text else 0} chars")
                         except Exception as file_err:
@@ -440,101 +706,56 @@ async def start_interview_with_saved_cv(
                             continue
                 except Exception as openai_err:
                     logger.error(f"Error using OpenAI Vision for extraction: {openai_err}")
+
+            cv_text_ok = extracted
         
 
-        if not cv_text or len(cv_text.strip()) < 100:
-            logger.warning("Attempting to recover by creating a file with timestamp-based naming in the shared volume")
+        # Stored text that turned out too short never went through the files
+        # above, so try them now. When they were already tried there is nothing
+        # to recover: extracting the same file again, or a renamed copy of it,
+        # gives the same result.
+        if not cv_text_ok and valid_paths is None:
+            logger.warning("Stored CV text is too short, extracting from the CV file instead")
             try:
-
-                existing_file = None
-                for path in potential_paths:
-                    if os.path.exists(path):
-                        existing_file = path
-                        break
+                valid_paths = await existing_file_paths(get_potential_file_paths(cv_document))
+                existing_file = valid_paths[0] if valid_paths else None
                 
                 if existing_file:
-                   
-                    timestamp_id = generate_timestamp_id()
-                    
-                    original_name = cv_document.get('originalName', 'recovered.pdf')
-                    clean_original_name = clean_filename(original_name)
-                    new_path = f"/app/uploads/{timestamp_id}_{clean_original_name}"
-                    
-                   
-                    with open(existing_file, 'rb') as src:
-                        with open(new_path, 'wb') as dst:
-                            dst.write(src.read())
-                    logger.info(f"Created new file with timestamp-based naming at: {new_path}")
-                    
-                  
-                    cv_text = extract_text_from_document(new_path, vision_client, openai_client)
+                    cv_text = await extract_cv_text(existing_file)
+                    cv_text_ok = has_enough_text(cv_text)
                     
-                    if cv_text and len(cv_text.strip()) >= 100:
-        
-                        await current_collection.update_one(
-                            {"_id": cv_document["_id"]},
-                            {"$set": {
-                                "extractedText": cv_text,
-                                "filePath": new_path,
-                                "fileId": timestamp_id,
-                                "lastUsed": datetime.utcnow()
-                            }}
-                        )
-                        logger.info(f"Updated CV document with new file path, timestamp ID, and extracted text: {new_path}")
+                    if cv_text_ok:
+                        # Point the document at the file where it actually is
+                        pending_update.update({**extracted_text_fields(cv_text), "filePath": existing_file})
                     else:
-                        logger.warning(f"Failed to extract sufficient text from newly created file")
+                        logger.warning(f"Failed to extract sufficient text from {existing_file}")
             except Exception as recovery_err:
                 logger.error(f"Recovery attempt failed: {recovery_err}")
      
-        if not cv_text or len(cv_text.strip()) < 100:
+        if not cv_text_ok:
             logger.error(f"Could not extract sufficient content from CV after all attempts. Length: {len(cv_text) if cv_text else 0} chars")
+            if pending_update:
+                # Keep an uploaded file's ID for the next attempt
+                background_tasks.add_task(
+                    update_cv_document, current_collection, cv_document["_id"], pending_update
+                )
             return JSONResponse(
                 status_code=400,
                 content={"detail": "Could not extract sufficient content from CV. Please upload a different file format or ensure the CV contains readable text."}
             )
         
        
-        session_id = str(uuid.uuid4())
-        logger.info(f"Generated session ID: {session_id}")
-        
-
-        initial_ai_text = (
-            f"Thank you for selecting your CV for the {data.job_role} position. "
-            "Let's begin the interview. Can you tell me about yourself?"
-        )
-        
-    
-        conversation_doc = {
-            "session_id": session_id,
-            "user_id": user_id,
-            "job_role": data.job_role,
-            "cv_text": cv_text,
-            "messages": [{"sender": "ai", "text": initial_ai_text}],
-            "created_at": datetime.utcnow(),
-            "finished": False,
-            "max_questions": MAX_INTERVIEW_QUESTIONS,
-            "cv_id": data.cv_id 
-        }
-        
-       
-        if conversations_col is not None:
-            try:
-                result = await conversations_col.insert_one(conversation_doc)
-                logger.info(f"Saved conversation to MongoDB: {session_id}")
-            except Exception as db_err:
-                logger.error(f"MongoDB error: {db_err}")
-               
-        else:
-            logger.warning("MongoDB not available, session not saved")
-        
-       
-        response_data = {
-            "session_id": session_id,
-            "first_ai_message": {"sender": "ai", "text": initial_ai_text}
-        }
+        session_cv_text = await conversation_cv_text(cv_text, cv_document, pending_update)
+        if session_cv_text is not cv_text:
+            logger.info(f"Storing {len(session_cv_text)} of {len(cv_text)} CV chars with the session")
+        remember_session_cv_text(user_id, data.cv_id, session_cv_text)
         
-        logger.info(f"Returning response: {response_data}")
-        return JSONResponse(content=response_data)
+        response = await create_interview_session(user_id, data, session_cv_text)
+        if pending_update:
+            background_tasks.add_task(
+                update_cv_document, current_collection, cv_document["_id"], pending_update
+            )
+        return response
     
     except Exception as e:
         logger.error(f"Unexpected error in start_interview_with_saved_cv: {e}")